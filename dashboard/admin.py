@@ -1,3 +1,12 @@
+# dashboard/admin.py
 from django.contrib import admin
 
-# Register your models here.
+from .models import CurrencyRate
+
+
+@admin.register(CurrencyRate)
+class CurrencyRateAdmin(admin.ModelAdmin):
+    list_display = ("currency", "rate_to_idr", "effective_from")
+    list_filter = ("currency",)
+    date_hierarchy = "effective_from"
+    ordering = ("currency", "-effective_from")
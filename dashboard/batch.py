@@ -0,0 +1,111 @@
+# dashboard/batch.py
+"""
+Status changes, edits and deletes applied to many invoices at once.
+
+The targets are read and locked with one values() query; the rollup and
+dimension deltas are computed from those rows in Python, and the change
+itself is a single UPDATE / DELETE ... WHERE id IN (...). Call everything,
+from target_rows() on, inside one transaction.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+
+from . import dimensions, rollups
+from .models import Invoice, Party, Product
+
+BATCH_MAX = 5000
+# ids per DELETE statement (stays under SQLite's bound-parameter limit)
+DELETE_CHUNK = 500
+# fields a batch edit may set; amount, currency, date and invoice number
+# are per-invoice values and stay with the single-invoice update
+BATCH_FIELDS = ("status", "remark_id", "product", "from_party", "to_party")
+# name field -> (ref field, ref position in Invoice._dimension_refs(), dimension model)
+_REF_FIELDS = {
+    "product": ("product_ref_id", 0, Product),
+    "from_party": ("from_party_ref_id", 1, Party),
+    "to_party": ("to_party_ref_id", 2, Party),
+}
+_ROW_FIELDS = (
+    "id", "invoice_number", "date", "remark_id", "status", "currency", "amount", "amount_idr",
+    "product", "from_party", "to_party", "product_ref_id", "from_party_ref_id", "to_party_ref_id",
+)
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def target_rows(qs):
+    """
+    The rows of `qs` a batch needs, at most BATCH_MAX of them, locked until
+    the transaction ends so the deltas are computed from current values.
+    """
+    qs = qs.select_for_update(of=("self",)).order_by("id")
+    rows = list(qs.values(*_ROW_FIELDS)[:BATCH_MAX + 1])
+    if len(rows) > BATCH_MAX:
+        raise BatchTooLarge(f"At most {BATCH_MAX} invoices can be changed at once.")
+    return rows
+
+
+def _rollup_delta(deltas, row, sign):
+    key = rollups.rollup_key(row["date"], row["remark_id"], row["status"], row["currency"], row["to_party"])
+    c, a, i = deltas[key]
+    deltas[key] = (c + sign, a + sign * Decimal(row["amount"]), i + sign * Decimal(row["amount_idr"] or 0))
+
+
+def update_invoices(rows, changes):
+    """
+    Set `changes` ({field: value}, fields from BATCH_FIELDS) on every row.
+    Returns the rows that actually changed, as (row before, row after).
+    """
+    changes = dict(changes)
+    for field, (ref_field, _, model) in _REF_FIELDS.items():
+        if field in changes:
+            changes[ref_field] = dimensions.resolve_many(model, [changes[field]])[changes[field]]
+
+    changed = [(row, {**row, **changes}) for row in rows]
+    changed = [(before, after) for before, after in changed if before != after]
+    if not changed:
+        return []
+
+    rollup_deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    ref_deltas = defaultdict(int)
+    for before, after in changed:
+        _rollup_delta(rollup_deltas, before, -1)
+        _rollup_delta(rollup_deltas, after, 1)
+        for ref_field, pos, _ in _REF_FIELDS.values():
+            ref_deltas[(pos, before[ref_field])] -= 1
+            ref_deltas[(pos, after[ref_field])] += 1
+
+    Invoice.objects.filter(id__in=[before["id"] for before, _ in changed]).update(**changes)
+    rollups.apply_deltas(rollup_deltas)
+    dimensions.apply_ref_deltas(ref_deltas)
+    return changed
+
+
+def delete_invoices(rows):
+    """Delete every row with one DELETE; returns the number deleted."""
+    if not rows:
+        return 0
+    rollup_deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    ref_deltas = defaultdict(int)
+    for row in rows:
+        _rollup_delta(rollup_deltas, row, -1)
+        for ref_field, pos, _ in _REF_FIELDS.values():
+            ref_deltas[(pos, row[ref_field])] -= 1
+
+    # Nothing references Invoice, so plain SQL skips only the per-row
+    # post_delete receiver, whose reference counts are released in bulk here
+    ids = [row["id"] for row in rows]
+    table = connection.ops.quote_name(Invoice._meta.db_table)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), DELETE_CHUNK):
+            chunk = ids[start:start + DELETE_CHUNK]
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            deleted += cursor.rowcount
+    rollups.apply_deltas(rollup_deltas)
+    dimensions.apply_ref_deltas(ref_deltas)
+    return deleted
@@ -0,0 +1,146 @@
+# dashboard/cache_backends.py
+"""
+Two-level cache: a small in-process LocMemCache (L1) in front of a cache
+shared by every worker (the database table or a filesystem directory).
+
+Reads try L1 first and fill it from the shared tier; writes go to both.
+Keys with a PASSTHROUGH prefix (data-version counters, locks) always go
+to the shared tier. The derived data is cached under keys that contain
+those versions (see caching.py), so an L1 hit is checked against the
+shared tier by the version lookup that built the key. Other keys can be
+up to L1_TIMEOUT seconds stale in another process.
+
+If the shared tier fails (e.g. the cache table is missing), the error is
+logged and the request carries on with L1 only.
+"""
+import logging
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+
+        shared = dict(options["SHARED"])
+        backend = import_string(shared.pop("BACKEND"))
+        shared_location = shared.pop("LOCATION", "")
+        shared.setdefault("TIMEOUT", params.get("TIMEOUT", 300))
+        self.shared = backend(shared_location, shared)
+
+        self.l1_timeout = options.get("L1_TIMEOUT", 30)
+        self.l1 = LocMemCache(
+            f"l1-{location or 'default'}",
+            {"TIMEOUT": self.l1_timeout, "OPTIONS": {"MAX_ENTRIES": options.get("L1_MAX_ENTRIES", 1000)}},
+        )
+        self.passthrough = tuple(options.get("PASSTHROUGH_PREFIXES", ("data_version:", "lock:")))
+
+    # ---- helpers ----
+    def _local(self, key):
+        return not str(key).startswith(self.passthrough)
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def _shared(self, method, *args, default=None, **kwargs):
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception:
+            logger.warning("Shared cache %s failed; using the in-process cache only", method, exc_info=True)
+            return default
+
+    # ---- cache API ----
+    def get(self, key, default=None, version=None):
+        if self._local(key):
+            value = self.l1.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                return value
+        value = self._shared("get", key, _MISSING, version=version, default=_MISSING)
+        if value is _MISSING:
+            return default
+        if self._local(key):
+            self.l1.set(key, value, self.l1_timeout, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared("set", key, value, timeout, version=version)
+        if self._local(key):
+            self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._shared("add", key, value, timeout, version=version, default=_MISSING)
+        if added is _MISSING:
+            added = self.l1.add(key, value, self._l1_timeout(timeout), version=version)
+        elif added and self._local(key):
+            self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.touch(key, self._l1_timeout(timeout), version=version)
+        return bool(self._shared("touch", key, timeout, version=version, default=False))
+
+    def delete(self, key, version=None):
+        self.l1.delete(key, version=version)
+        return bool(self._shared("delete", key, version=version, default=False))
+
+    def has_key(self, key, version=None):
+        if self._local(key) and self.l1.has_key(key, version=version):
+            return True
+        return bool(self._shared("has_key", key, version=version, default=False))
+
+    def incr(self, key, delta=1, version=None):
+        try:
+            value = self.shared.incr(key, delta, version=version)
+        except ValueError:
+            # key missing: same contract as every other backend
+            raise
+        except Exception:
+            logger.warning("Shared cache incr failed; using the in-process cache only", exc_info=True)
+            return self.l1.incr(key, delta, version=version)
+        self.l1.delete(key, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self.l1.get(key, _MISSING, version=version) if self._local(key) else _MISSING
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        if remaining:
+            shared = self._shared("get_many", remaining, version=version, default={})
+            for key, value in shared.items():
+                if self._local(key):
+                    self.l1.set(key, value, self.l1_timeout, version=version)
+            found.update(shared)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._shared("set_many", data, timeout, version=version, default=list(data))
+        for key, value in data.items():
+            if self._local(key):
+                self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.l1.delete(key, version=version)
+        self._shared("delete_many", keys, version=version)
+
+    def clear(self):
+        self.l1.clear()
+        self._shared("clear")
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
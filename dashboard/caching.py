@@ -0,0 +1,195 @@
+# dashboard/caching.py
+"""
+Generation-based cache invalidation.
+
+Derived data (filter lists, chart payloads, ...) is cached under keys that
+embed the current data version of a namespace. A write bumps the version
+once, after its transaction commits, and every key built from the old
+version simply stops being read - no list of keys to delete, O(1) work
+per write. Stale entries age out through their TTL.
+
+get_or_compute() adds single-flight recomputation on top, so an expired or
+invalidated entry is rebuilt by one request instead of all of them.
+"""
+import contextvars
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# invoices, remarks and everything derived from them
+INVOICES = "invoices"
+# the CurrencyRate timeline (see rates.py)
+RATES = "rates"
+# audit log entries (bumped by log.utils.log_action)
+LOG = "log"
+
+_VERSION_KEY = "data_version:{}"
+# wall-clock time of the last bump, for Last-Modified headers
+_CHANGED_KEY = "data_version:{}:changed_at"
+
+
+def _new_version():
+    # a clock value rather than a counter, so a version key that was evicted
+    # or lost with a restart never comes back as an old number; the random
+    # suffix keeps two bumps in the same microsecond apart
+    return time.time_ns() // 1000 * 1000 + secrets.randbelow(1000)
+
+
+def data_version(namespace=INVOICES):
+    """Current generation of `namespace` (an int, new after every bump)."""
+    key = _VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def data_state(namespace=INVOICES):
+    """(version, changed_at) of `namespace`; changed_at is a Unix timestamp."""
+    version_key, changed_key = _VERSION_KEY.format(namespace), _CHANGED_KEY.format(namespace)
+    found = cache.get_many([version_key, changed_key])
+    version = found.get(version_key)
+    if version is None:
+        version = data_version(namespace)
+    changed_at = found.get(changed_key)
+    if changed_at is None:
+        # unknown (never bumped, or evicted): treat as changed now
+        changed_at = time.time()
+        cache.add(changed_key, changed_at, None)
+    return version, changed_at
+
+
+def _bump_now(namespace):
+    # a plain set() of a fresh value: incr() is a read and a write on some
+    # backends (the database cache), so two concurrent bumps could both
+    # write the same number and one of them would be lost
+    cache.set(_VERSION_KEY.format(namespace), _new_version(), None)
+    cache.set(_CHANGED_KEY.format(namespace), time.time(), None)
+
+
+def bump_data_version(namespace=INVOICES):
+    """Invalidate every key of `namespace` once the current transaction commits."""
+    transaction.on_commit(lambda: _bump_now(namespace))
+
+
+def versioned_key(name, *parts, namespace=INVOICES, version=None):
+    """Cache key for derived data, e.g. versioned_key("chart_data", "USD")."""
+    if version is None:
+        version = data_version(namespace)
+    suffix = ":".join(str(p) for p in parts)
+    return f"{name}:{namespace}:{version}" + (f":{suffix}" if suffix else "")
+
+
+# ---------- single-flight recompute ----------
+# how long a recompute may hold its lock before another request may take over
+LOCK_TIMEOUT = 30
+# how long a request waits for another one's recompute before giving up
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+
+# names answered with a last good value inside track_fallbacks()
+_fallbacks = contextvars.ContextVar("cache_fallbacks", default=None)
+
+
+@contextmanager
+def track_fallbacks():
+    """
+    Yield a list that collects the names get_or_compute() answered with a
+    last good value (computed for an older version) inside the block.
+    """
+    served = []
+    token = _fallbacks.set(served)
+    try:
+        yield served
+    finally:
+        _fallbacks.reset(token)
+
+
+def _serve_fallback(name, value):
+    served = _fallbacks.get()
+    if served is not None:
+        served.append(name)
+    return value
+
+
+def _store(key, fallback_key, value, ttl, soft_ttl):
+    fresh_until = time.time() + soft_ttl if soft_ttl else None
+    cache.set(key, (fresh_until, value), ttl)
+    # the last good value outlives the versioned entry, so a miss after a
+    # version bump still has something to serve
+    cache.set(fallback_key, value, max(ttl, 86400))
+    return value
+
+
+def _refresh(key, lock_key, fallback_key, fn, ttl, soft_ttl):
+    try:
+        return _store(key, fallback_key, fn(), ttl, soft_ttl)
+    finally:
+        cache.delete(lock_key)
+
+
+def _refresh_in_background(*args):
+    def run():
+        try:
+            _refresh(*args)
+        except Exception:
+            logger.exception("Background cache refresh of %s failed", args[0])
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_or_compute(name, fn, ttl, *parts, soft_ttl=None, namespace=INVOICES, version=None):
+    """
+    Return the cached value of versioned_key(name, *parts), computing it with fn()
+    on a miss. Only the request holding the per-key lock runs fn(); the others
+    wait up to LOCK_WAIT seconds for it and then fall back to the last good value
+    (the one computed for an earlier version or TTL).
+
+    With soft_ttl, a value older than soft_ttl seconds is still returned and a
+    background thread recomputes it; misses then return the last good value
+    right away instead of waiting.
+
+    Last good values are reported to track_fallbacks(), so callers can
+    avoid labelling them with the current version (see conditional.py).
+    """
+    key = versioned_key(name, *parts, namespace=namespace, version=version)
+    fallback_key = f"last_good:{name}:{namespace}" + "".join(f":{p}" for p in parts)
+    lock_key = f"lock:{key}"
+
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if fresh_until is not None and time.time() >= fresh_until and cache.add(lock_key, 1, LOCK_TIMEOUT):
+            _refresh_in_background(key, lock_key, fallback_key, fn, ttl, soft_ttl)
+        return value
+
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return _refresh(key, lock_key, fallback_key, fn, ttl, soft_ttl)
+
+    # somebody else is computing it
+    if soft_ttl:
+        stale = cache.get(fallback_key)
+        if stale is not None:
+            return _serve_fallback(name, stale)
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    stale = cache.get(fallback_key)
+    if stale is not None:
+        return _serve_fallback(name, stale)
+    # no value anywhere and the lock holder is slow: compute without the lock
+    return _store(key, fallback_key, fn(), ttl, soft_ttl)
@@ -0,0 +1,70 @@
+# dashboard/conditional.py
+"""
+Conditional GET for the polled read APIs.
+
+The ETag is a hash of the data versions a view depends on plus its path
+and query string, and Last-Modified is the time of the latest bump. Both
+come from the cache (no database query), so a poll that matches
+If-None-Match / If-Modified-Since gets a 304 before the view runs.
+
+A response built from a last good cache value (an older version, see
+caching.get_or_compute) carries no validators and is not stored: an ETag
+for the current version would let clients keep the stale copy with 304s.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .caching import data_state, track_fallbacks
+
+
+def _states(request, namespaces):
+    # etag_func and last_modified_func both need these; read them once
+    memo = request.__dict__.setdefault("_data_states", {})
+    key = tuple(namespaces)
+    if key not in memo:
+        memo[key] = [data_state(ns) for ns in namespaces]
+    return memo[key]
+
+
+def data_etag(request, namespaces):
+    versions = ",".join(f"{ns}={v}" for ns, (v, _) in zip(namespaces, _states(request, namespaces)))
+    params = "&".join(f"{k}={v}" for k, values in sorted(request.GET.lists()) for v in values)
+    return hashlib.sha1(f"{request.path}?{params}|{versions}".encode()).hexdigest()
+
+
+def data_last_modified(request, namespaces):
+    changed_at = max(changed for _, changed in _states(request, namespaces))
+    return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+def conditional_on(*namespaces):
+    """
+    Decorator: answer GET/HEAD with 304 when nothing in `namespaces` changed
+    since the client's copy. Responses are marked private, no-cache so the
+    browser always revalidates instead of reusing them blindly; responses
+    served from a fallback value lose their validators and are no-store.
+    """
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda request, *a, **kw: data_etag(request, namespaces),
+            last_modified_func=lambda request, *a, **kw: data_last_modified(request, namespaces),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with track_fallbacks() as fallbacks:
+                response = conditional_view(request, *args, **kwargs)
+            if fallbacks:
+                for header in ("ETag", "Last-Modified"):
+                    if response.has_header(header):
+                        del response[header]
+                patch_cache_control(response, private=True, no_store=True)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+# dashboard/dimensions.py
+"""
+Maintenance of the Product and Party dimension tables.
+
+Invoice.save() maps the product / party names to dimension rows and moves
+their reference counts; the post_delete receiver releases them. Rows whose
+counts drop to zero stay in the table but disappear from the filter lists.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Invoice, Party, Product
+
+
+def _get_or_create_id(model, name):
+    pk = model.objects.filter(name=name).values_list("id", flat=True).first()
+    if pk is not None:
+        return pk
+    try:
+        with transaction.atomic():
+            return model.objects.create(name=name).pk
+    except IntegrityError:
+        # another writer created it first
+        return model.objects.values_list("id", flat=True).get(name=name)
+
+
+def resolve_many(model, names):
+    """{name: id} for every name, creating missing rows with one bulk insert."""
+    names = set(names)
+    found = dict(model.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - found.keys()
+    if missing:
+        model.objects.bulk_create([model(name=n) for n in missing], ignore_conflicts=True)
+        found.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+    return found
+
+
+def resolve(product, from_party, to_party):
+    """(product_id, from_party_id, to_party_id) for the given names, creating rows as needed."""
+    return (
+        _get_or_create_id(Product, product),
+        _get_or_create_id(Party, from_party),
+        _get_or_create_id(Party, to_party),
+    )
+
+
+# ref position -> (model, count field)
+_COUNTERS = (
+    (Product, "invoice_count"),
+    (Party, "sent_count"),
+    (Party, "received_count"),
+)
+
+
+def apply_ref_deltas(deltas):
+    """Apply {(position, id): delta} where position indexes _COUNTERS."""
+    for (pos, pk), delta in deltas.items():
+        if pk is None or not delta:
+            continue
+        model, field = _COUNTERS[pos]
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def move_refs(before, after):
+    """Move reference counts from the `before` refs of an invoice to its `after` refs."""
+    deltas = {}
+    for pos, (old, new) in enumerate(zip(before, after)):
+        if old != new:
+            deltas[(pos, old)] = deltas.get((pos, old), 0) - 1
+            deltas[(pos, new)] = deltas.get((pos, new), 0) + 1
+    apply_ref_deltas(deltas)
+
+
+def rebuild():
+    """Recompute every reference count from the invoice table."""
+    sources = (
+        (Product, "invoice_count", "product_ref_id"),
+        (Party, "sent_count", "from_party_ref_id"),
+        (Party, "received_count", "to_party_ref_id"),
+    )
+    with transaction.atomic():
+        for model, field, ref in sources:
+            model.objects.update(**{field: 0})
+            for row in Invoice.objects.values(ref).annotate(n=Count("id")).order_by():
+                if row[ref] is not None:
+                    model.objects.filter(pk=row[ref]).update(**{field: row["n"]})
@@ -0,0 +1,172 @@
+# dashboard/exports.py
+"""
+Constant-memory export writers (xlsx, csv, ndjson.gz) shared by the invoice
+and activity-log downloads. Rows are consumed from an iterator (normally a
+keyset_iterator over a values() projection) and never held in memory all
+at once.
+"""
+import csv
+import tempfile
+import zlib
+from itertools import chain, islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+    EXCEL_AVAILABLE = True
+except ImportError:
+    EXCEL_AVAILABLE = False
+
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# ?format= value -> (content type, file extension)
+EXPORT_FORMATS = {
+    "xlsx": (XLSX_CONTENT_TYPE, ".xlsx"),
+    "csv": ("text/csv; charset=utf-8", ".csv"),
+    "ndjson.gz": ("application/gzip", ".ndjson.gz"),
+}
+
+# rows grouped into one chunk of the streamed body
+STREAM_ROWS_PER_CHUNK = 500
+
+# rows inspected to size the columns; write-only sheets emit <cols> before
+# the first row, so widths have to be known up front
+XLSX_WIDTH_SAMPLE = 1000
+
+
+def _header_cells(ws, headers):
+    fill = PatternFill(start_color="102B86", end_color="102B86", fill_type="solid")
+    font = Font(color="FFFFFF", bold=True)
+    alignment = Alignment(horizontal="center", vertical="center")
+    cells = []
+    for h in headers:
+        c = WriteOnlyCell(ws, value=h)
+        c.fill = fill
+        c.font = font
+        c.alignment = alignment
+        cells.append(c)
+    return cells
+
+
+def write_xlsx(fileobj, title, headers, rows, max_width=50):
+    """
+    Write `rows` (iterable of sequences) to `fileobj` as a single-sheet
+    workbook using openpyxl write-only mode.
+
+    Column widths are estimated from the header and the first
+    XLSX_WIDTH_SAMPLE rows, updated as those rows are read.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    rows = iter(rows)
+    sample = []
+    widths = [len(str(h)) for h in headers]
+    for row in islice(rows, XLSX_WIDTH_SAMPLE):
+        sample.append(row)
+        for i, value in enumerate(row):
+            n = len(str(value)) if value is not None else 0
+            if n > widths[i]:
+                widths[i] = n
+    for i, w in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(w + 2, max_width)
+
+    ws.append(_header_cells(ws, headers))
+    for row in chain(sample, rows):
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def xlsx_response(filename, title, headers, rows, max_width=50):
+    """
+    Build the workbook in a temporary file and stream it back in blocks,
+    so the response never holds a full copy of the file in memory.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        write_xlsx(tmp, title, headers, rows, max_width=max_width)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+class _Echo:
+    """File-like object whose write() hands the encoded line straight back."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(headers, rows):
+    """Yield CSV text in chunks of STREAM_ROWS_PER_CHUNK rows."""
+    writer = csv.writer(_Echo())
+    buf = [writer.writerow(headers)]
+    for row in rows:
+        buf.append(writer.writerow(row))
+        if len(buf) >= STREAM_ROWS_PER_CHUNK:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+def iter_ndjson_gz(keys, rows, level=6):
+    """
+    Yield a gzip stream of one JSON object per row, compressed on the fly.
+    `keys` names the fields of each row.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    buf = []
+    for row in rows:
+        buf.append(encoder.encode(dict(zip(keys, row))))
+        if len(buf) >= STREAM_ROWS_PER_CHUNK:
+            chunk = z.compress(("\n".join(buf) + "\n").encode())
+            buf = []
+            if chunk:
+                yield chunk
+    if buf:
+        chunk = z.compress(("\n".join(buf) + "\n").encode())
+        if chunk:
+            yield chunk
+    yield z.flush()
+
+
+def write_export(fileobj, fmt, title, headers, keys, rows, max_width=50):
+    """Write `rows` in `fmt` to a binary file object (used by export jobs)."""
+    if fmt == "xlsx":
+        write_xlsx(fileobj, title, headers, rows, max_width=max_width)
+    elif fmt == "csv":
+        for chunk in iter_csv(headers, rows):
+            fileobj.write(chunk.encode("utf-8"))
+    else:
+        for chunk in iter_ndjson_gz(keys, rows):
+            fileobj.write(chunk)
+
+
+def export_response(fmt, basename, title, headers, keys, rows, max_width=50):
+    """
+    Return a download response for `rows` in `fmt` (see EXPORT_FORMATS).
+    csv and ndjson.gz stream straight from the row iterator; xlsx goes
+    through a write-only workbook in a temporary file.
+    """
+    content_type, ext = EXPORT_FORMATS[fmt]
+    filename = f"{basename}{ext}"
+    if fmt == "xlsx":
+        return xlsx_response(filename, title, headers, rows, max_width=max_width)
+
+    if fmt == "csv":
+        body = iter_csv(headers, rows)
+    else:
+        body = iter_ndjson_gz(keys, rows)
+    resp = StreamingHttpResponse(body, content_type=content_type)
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -0,0 +1,224 @@
+# dashboard/imports.py
+"""
+Bulk invoice import from CSV or XLSX.
+
+The file uses the export columns (Product, Date, Invoice Remarks, Invoice
+Number, Amount, Currency, Status, From, To; the export keys work as
+headers too), so an export can be edited and imported back. Rows are
+read as a stream, validated in full, and only written when every row is
+valid: bulk_create in batches inside one transaction, with the derived
+data that Invoice.save() would normally maintain (amount_idr, product /
+party references and their counts, rollup deltas) computed for the whole
+batch at once.
+"""
+import codecs
+import csv
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import dimensions, rollups
+from .exports import EXCEL_AVAILABLE
+from .models import CURRENCY_CHOICES, STATUS_CHOICES, Invoice, InvoiceRemarkCategory, Party, Product
+from .rates import amounts_in_idr
+
+IMPORT_FORMATS = ("csv", "xlsx")
+IMPORT_MAX_ROWS = 5000
+IMPORT_BATCH_SIZE = 500
+# errors reported back; validation stops counting details after this many
+IMPORT_MAX_ERRORS = 200
+
+# accepted header (lower-case) -> field
+IMPORT_COLUMNS = {
+    "product": "product",
+    "date": "date",
+    "invoice remarks": "remark",
+    "remark": "remark",
+    "invoice number": "invoice_number",
+    "invoice_number": "invoice_number",
+    "amount": "amount",
+    "currency": "currency",
+    "status": "status",
+    "from": "from_party",
+    "from_party": "from_party",
+    "to": "to_party",
+    "to_party": "to_party",
+}
+REQUIRED_COLUMNS = ("product", "date", "remark", "invoice_number", "amount", "from_party", "to_party")
+
+CURRENCIES = {c for c, _ in CURRENCY_CHOICES}
+# statuses typed into a spreadsheet are matched case-insensitively
+STATUSES = {s.lower(): s for s, _ in STATUS_CHOICES}
+
+
+class ImportFileError(ValueError):
+    """The file as a whole can't be read (format, header, size)."""
+
+
+def _iter_csv(fileobj):
+    return csv.reader(codecs.iterdecode(fileobj, "utf-8-sig"))
+
+
+def _iter_xlsx(fileobj):
+    if not EXCEL_AVAILABLE:
+        raise ImportFileError("openpyxl not installed")
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def read_rows(fileobj, fmt):
+    """Yield (row number, {field: raw value}) for each non-empty data row."""
+    rows = _iter_xlsx(fileobj) if fmt == "xlsx" else _iter_csv(fileobj)
+    header = next(rows, None)
+    if not header:
+        raise ImportFileError("The file is empty.")
+    fields = [IMPORT_COLUMNS.get(str(h or "").strip().lower()) for h in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in fields]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+
+    for number, values in enumerate(rows, start=2):
+        if not any(v not in (None, "") for v in values):
+            continue
+        yield number, {f: v for f, v in zip(fields, values) if f}
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(_text(value), "%Y-%m-%d").date()
+
+
+def _parse_amount(value):
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    return Decimal(_text(value).replace(",", "."))
+
+
+def validate_row(raw, remarks):
+    """Return (invoice field dict, None) or (None, error message) for one row."""
+    data = {f: _text(raw.get(f)) for f in ("product", "invoice_number", "from_party", "to_party")}
+    for field in ("product", "invoice_number", "from_party", "to_party"):
+        if not data[field]:
+            return None, f"{field} is required"
+    if len(data["invoice_number"]) > 120 or max(len(data[f]) for f in ("product", "from_party", "to_party")) > 200:
+        return None, "value too long"
+    try:
+        data["date"] = _parse_date(raw.get("date"))
+    except (TypeError, ValueError):
+        return None, "date must be YYYY-MM-DD"
+    try:
+        data["amount"] = _parse_amount(raw.get("amount"))
+    except (InvalidOperation, ValueError):
+        return None, "amount is not a number"
+    if data["amount"].as_tuple().exponent < -2 or abs(data["amount"]) >= Decimal("1e12"):
+        return None, "amount must have at most 12 digits and 2 decimals"
+
+    data["currency"] = _text(raw.get("currency")).upper() or "IDR"
+    if data["currency"] not in CURRENCIES:
+        return None, f"currency must be one of {', '.join(sorted(CURRENCIES))}"
+    status = _text(raw.get("status")) or "Unpaid"
+    if status.lower() not in STATUSES:
+        return None, f"unknown status {status!r}"
+    data["status"] = STATUSES[status.lower()]
+
+    remark = _text(raw.get("remark"))
+    remark_id = remarks.get(remark.lower())
+    if remark_id is None:
+        return None, f"unknown invoice remark {remark!r}" if remark else "invoice remark is required"
+    data["remark_id"] = remark_id
+    return data, None
+
+
+def load_remarks():
+    """Every remark in one query, keyed case-insensitively like their unique constraint."""
+    return {name.lower(): pk for pk, name in InvoiceRemarkCategory.objects.values_list("id", "name")}
+
+
+def validate(rows, remarks):
+    """
+    Validate (row number, raw) pairs. Returns (valid field dicts, errors)
+    where errors is a list of {"row": n, "error": msg}.
+    """
+    valid, errors = [], []
+    for count, (number, raw) in enumerate(rows, start=1):
+        if count > IMPORT_MAX_ROWS:
+            raise ImportFileError(f"Too many rows; import at most {IMPORT_MAX_ROWS} at a time.")
+        data, error = validate_row(raw, remarks)
+        if error:
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"row": number, "error": error})
+            else:
+                errors[-1] = {"row": number, "error": "too many errors; stopped listing them"}
+        else:
+            valid.append(data)
+    return valid, errors
+
+
+def import_invoices(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Insert validated rows (from validate()) and maintain the derived data.
+    Must run inside a transaction; returns the number of invoices created.
+    """
+    product_ids = dimensions.resolve_many(Product, {r["product"] for r in rows})
+    party_ids = dimensions.resolve_many(Party, {r[f] for r in rows for f in ("from_party", "to_party")})
+    idr = amounts_in_idr([(r["amount"], r["currency"], r["date"]) for r in rows])
+
+    ref_deltas = defaultdict(int)
+    rollup_deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    invoices = []
+    for r, amount_idr in zip(rows, idr):
+        inv = Invoice(
+            amount_idr=amount_idr,
+            product_ref_id=product_ids[r["product"]],
+            from_party_ref_id=party_ids[r["from_party"]],
+            to_party_ref_id=party_ids[r["to_party"]],
+            **r,
+        )
+        invoices.append(inv)
+        for pos, ref in enumerate(inv._dimension_refs()):
+            ref_deltas[(pos, ref)] += 1
+        key, amount, amount_idr = rollups.invoice_snapshot(inv)
+        c, a, i = rollup_deltas[key]
+        rollup_deltas[key] = (c + 1, a + amount, i + amount_idr)
+
+    Invoice.objects.bulk_create(invoices, batch_size=batch_size)
+    dimensions.apply_ref_deltas(ref_deltas)
+    rollups.apply_deltas(rollup_deltas)
+    return len(invoices)
+
+
+def parse_file(fileobj, fmt):
+    """
+    Read and validate the whole file; returns (valid rows, errors). Anything
+    that goes wrong while reading it is raised as ImportFileError.
+    """
+    remarks = load_remarks()
+    try:
+        return validate(read_rows(fileobj, fmt), remarks)
+    except ImportFileError:
+        raise
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV files must be UTF-8.")
+    except Exception:
+        # openpyxl raises a variety of errors on files that aren't workbooks
+        raise ImportFileError("Not a valid CSV / XLSX file.")
+
+
+def import_rows(valid):
+    """Insert rows from parse_file() in one transaction; returns the number created."""
+    with transaction.atomic():
+        return import_invoices(valid)
@@ -0,0 +1,120 @@
+# dashboard/jobs.py
+"""
+Background export jobs.
+
+Web requests only insert an ExportJob row; the `run_export_jobs` management
+command claims pending jobs, writes the file to a temporary file and saves
+it to the default storage, updating progress as it goes. Jobs left RUNNING
+by a worker that died are failed after settings.EXPORT_JOB_TIMEOUT.
+"""
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .exports import EXPORT_FORMATS, write_export
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# rows between two progress updates
+PROGRESS_EVERY = 5000
+
+
+def _export_source(job):
+    """Return (basename, title, headers, keys, queryset, row_fn, max_width) for a job."""
+    if job.kind == ExportJob.Kind.LOG:
+        from log.views import LOG_EXPORT_HEADERS, LOG_EXPORT_KEYS, _filter_logs, _log_export_rows
+        return ("activity_log", "Activity Log", LOG_EXPORT_HEADERS, LOG_EXPORT_KEYS,
+                _filter_logs(job.params), _log_export_rows, 60)
+
+    from .views import INVOICE_EXPORT_HEADERS, INVOICE_EXPORT_KEYS, _filter_invoices, _invoice_export_rows
+    return ("InvoiceSummaryFile", "Invoice Summary", INVOICE_EXPORT_HEADERS, INVOICE_EXPORT_KEYS,
+            _filter_invoices(job.params), _invoice_export_rows, 50)
+
+
+def enqueue_export(user, kind, fmt, params):
+    return ExportJob.objects.create(
+        kind=kind,
+        format=fmt,
+        params=params,
+        created_by=user if getattr(user, "is_authenticated", False) else None,
+    )
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest pending job to RUNNING and return it.
+    The conditional UPDATE makes this safe with several workers.
+    """
+    while True:
+        pk = (ExportJob.objects.filter(status=ExportJob.Status.PENDING)
+              .order_by("created_at", "id").values_list("id", flat=True).first())
+        if pk is None:
+            return None
+        claimed = ExportJob.objects.filter(pk=pk, status=ExportJob.Status.PENDING).update(
+            status=ExportJob.Status.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=pk)
+
+
+def fail_stale_jobs(timeout=None):
+    """
+    Mark RUNNING jobs started more than `timeout` seconds ago (default
+    settings.EXPORT_JOB_TIMEOUT) as FAILED; returns how many. They are not
+    requeued: a job that killed its worker would only kill the next one.
+    """
+    if timeout is None:
+        timeout = settings.EXPORT_JOB_TIMEOUT
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status=ExportJob.Status.RUNNING, started_at__lt=now - timedelta(seconds=timeout)
+    ).update(
+        status=ExportJob.Status.FAILED,
+        error="The export worker stopped before the job finished.",
+        finished_at=now,
+    )
+
+
+def _counted(rows, job_id):
+    n = 0
+    for row in rows:
+        yield row
+        n += 1
+        if n % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job_id).update(rows_done=n)
+    ExportJob.objects.filter(pk=job_id).update(rows_done=n)
+
+
+def run_export_job(job):
+    """Write the export for a claimed job and mark it DONE or FAILED."""
+    try:
+        if job.format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {job.format!r}")
+        basename, title, headers, keys, qs, row_fn, max_width = _export_source(job)
+
+        job.rows_total = qs.count()
+        ExportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+
+        _, ext = EXPORT_FORMATS[job.format]
+        with tempfile.TemporaryFile() as tmp:
+            write_export(tmp, job.format, title, headers, keys,
+                         _counted(row_fn(qs), job.pk), max_width=max_width)
+            tmp.seek(0)
+            job.file.save(f"{basename}-{job.pk}{ext}", File(tmp), save=False)
+
+        job.refresh_from_db(fields=["rows_done"])
+        job.status = ExportJob.Status.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=["file", "status", "finished_at", "rows_total"])
+    except Exception as e:
+        logger.exception("Export job %s failed", job.pk)
+        job.status = ExportJob.Status.FAILED
+        job.error = str(e)[:2000]
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+    return job
@@ -0,0 +1,74 @@
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from dashboard.cache_backends import TieredCache
+from dashboard.views import _chart_data
+
+DB_TABLE = "dashboard_cache"
+
+
+def _timed_gets(cache, key, n, before=None):
+    samples = []
+    for _ in range(n):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        value = cache.get(key)
+        samples.append((time.perf_counter() - t0) * 1e6)
+        assert value is not None, "benchmark key was not cached"
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+class Command(BaseCommand):
+    help = "Measure cache hit latency of each cache tier with a real chart payload."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        n = options["iterations"]
+        payload = _chart_data({})
+        tmpdir = tempfile.mkdtemp(prefix="bench-cache-")
+        key = "bench:chart_data"
+
+        shared = {
+            "file": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tmpdir},
+        }
+        backends = [
+            ("locmem", LocMemCache("bench-locmem", {})),
+            ("file", FileBasedCache(tmpdir, {})),
+        ]
+        if DB_TABLE in connection.introspection.table_names():
+            shared["db"] = {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": DB_TABLE}
+            backends.append(("db", DatabaseCache(DB_TABLE, {})))
+        else:
+            self.stdout.write(f"Skipping db tier: run `manage.py createcachetable {DB_TABLE}` first.")
+
+        tiered = {name: TieredCache("bench", {"OPTIONS": {"SHARED": cfg}}) for name, cfg in shared.items()}
+
+        rows = []
+        try:
+            for name, cache in backends:
+                cache.set(key, payload, 60)
+                rows.append((name, *_timed_gets(cache, key, n)))
+            for name, cache in tiered.items():
+                cache.set(key, payload, 60)
+                rows.append((f"{name} + L1 (hit)", *_timed_gets(cache, key, n)))
+                rows.append((f"{name} + L1 (cold)", *_timed_gets(cache, key, n, before=cache.l1.clear)))
+        finally:
+            for name, cache in backends + list(tiered.items()):
+                cache.delete(key)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        self.stdout.write(f"{'tier':<20}{'median us':>12}{'p95 us':>12}   ({n} gets)")
+        for name, median, p95 in rows:
+            self.stdout.write(f"{name:<20}{median:>12.1f}{p95:>12.1f}")
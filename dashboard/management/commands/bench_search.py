@@ -0,0 +1,96 @@
+import datetime
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from dashboard import dimensions, search
+from dashboard.models import Invoice, Party, Product
+from dashboard.views import _filter_invoices
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time `q` searches against a synthetic invoice table. The rows are inserted "
+        "inside a transaction that is rolled back, so the database (and the cached trigram counts) are left untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--batch", type=int, default=5000)
+
+    def _insert(self, rows, batch):
+        rnd = random.Random(42)
+        products = [f"Product {w}" for w in ("Alpha", "Bravo", "Charlie", "Delta", "Echo")]
+        products += [f"Item-{i:03d}" for i in range(300)]
+        parties = [f"Company {i:04d} Ltd" for i in range(500)]
+        product_ids = dimensions.resolve_many(Product, products)
+        party_ids = dimensions.resolve_many(Party, parties)
+        start = datetime.date(2015, 1, 1)
+        t0 = time.perf_counter()
+        for offset in range(0, rows, batch):
+            invoices = []
+            for n in range(offset, min(offset + batch, rows)):
+                product, sender, receiver = rnd.choice(products), rnd.choice(parties), rnd.choice(parties)
+                invoices.append(Invoice(
+                    product=product,
+                    product_ref_id=product_ids[product],
+                    date=start + datetime.timedelta(days=rnd.randrange(3650)),
+                    invoice_number=f"BENCH-{n:08d}",
+                    amount=Decimal(rnd.randrange(1, 10_000_000)) / 100,
+                    currency=rnd.choice(("IDR", "USD", "SGD")),
+                    from_party=sender,
+                    from_party_ref_id=party_ids[sender],
+                    to_party=receiver,
+                    to_party_ref_id=party_ids[receiver],
+                ))
+            Invoice.objects.bulk_create(invoices)
+        dimensions.rebuild()
+        self.stdout.write(f"Inserted {rows} rows in {time.perf_counter() - t0:.1f}s ({connection.vendor}).")
+
+    def _time(self, term, runs):
+        """First page of api_invoices?q=term: (hits, first run ms, median of the other runs ms)."""
+        timings = []
+        for _ in range(runs + 1):
+            t0 = time.perf_counter()
+            ids = list(
+                _filter_invoices({"q": term}).order_by("-date", "-id").values_list("id", flat=True)[:50]
+            )
+            timings.append((time.perf_counter() - t0) * 1000)
+        return len(ids), timings[0], statistics.median(timings[1:])
+
+    def handle(self, *args, **options):
+        rows, runs = options["rows"], options["runs"]
+        terms = [
+            ("one invoice number", f"BENCH-{rows // 3:08d}"),
+            ("number prefix", f"BENCH-{rows // 2:08d}"[:-1]),
+            ("digits", "333"),
+            ("one party", "Company 0042"),
+            ("one product", "Product Alpha"),
+            ("most products", "Item"),
+            ("every party", "Ltd"),
+            ("no match", "zzqqxx"),
+        ]
+        try:
+            with transaction.atomic():
+                self._insert(rows, options["batch"])
+                # "first" includes looking up trigram frequencies, which are then cached
+                self.stdout.write(f"{'query':<20}{'term':<18}{'hits':>6}{'first ms':>10}{'median ms':>11}")
+                for label, term in terms:
+                    hits, first, median = self._time(term, runs)
+                    self.stdout.write(f"{label:<20}{term:<18}{hits:>6}{first:>10.1f}{median:>11.1f}")
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Rolled back the benchmark rows.")
+        finally:
+            # the cached trigram counts describe the rolled-back rows
+            for model in (Invoice, Product, Party):
+                search.forget_doc_counts(model, [term for _, term in terms])
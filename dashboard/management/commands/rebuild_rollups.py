@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import rollups
+from dashboard.caching import bump_data_version
+
+
+class Command(BaseCommand):
+    help = "Rebuild the InvoiceRollup table from the invoice table, or verify it with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Only compare the rollup with the invoices; exit non-zero on drift.")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            problems = rollups.verify()
+            for key, expected, actual in problems[:50]:
+                self.stdout.write(f"{key}: expected {expected}, found {actual}")
+            if problems:
+                raise CommandError(f"{len(problems)} rollup row(s) out of date; run rebuild_rollups.")
+            self.stdout.write(self.style.SUCCESS("Rollup matches the invoice table."))
+            return
+
+        n = rollups.rebuild()
+        # reports cached from the old rollup rows
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollup: {n} row(s)."))
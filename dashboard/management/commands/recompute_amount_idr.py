@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from dashboard import rollups
+from dashboard.caching import bump_data_version
+from dashboard.models import Invoice
+from dashboard.pagination import keyset_iterator
+from dashboard.rates import amounts_in_idr
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill or recompute Invoice.amount_idr from the CurrencyRate table. "
+        "Run after adding or correcting rates (use --since to limit it to the affected dates)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--missing", action="store_true",
+                            help="Only fill invoices whose amount_idr is empty.")
+        parser.add_argument("--since", help="Only invoices dated on or after YYYY-MM-DD.")
+        parser.add_argument("--currency", help="Only invoices in this currency.")
+        parser.add_argument("--batch", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        qs = Invoice.objects.all()
+        if options["missing"]:
+            qs = qs.filter(amount_idr__isnull=True)
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+            qs = qs.filter(date__gte=since)
+        if options["currency"]:
+            qs = qs.filter(currency=options["currency"].upper())
+
+        batch_size = options["batch"]
+        rows = keyset_iterator(
+            qs.values("id", "amount", "currency", "date", "amount_idr"), ("id",), chunk_size=batch_size
+        )
+
+        seen = changed = 0
+        batch = []
+
+        def flush(batch):
+            values = amounts_in_idr([(r["amount"], r["currency"], r["date"]) for r in batch])
+            objs = [
+                Invoice(id=r["id"], amount_idr=v)
+                for r, v in zip(batch, values)
+                if r["amount_idr"] != v
+            ]
+            Invoice.objects.bulk_update(objs, ["amount_idr"], batch_size=batch_size)
+            return len(objs)
+
+        with transaction.atomic():
+            for row in rows:
+                batch.append(row)
+                seen += 1
+                if len(batch) >= batch_size:
+                    changed += flush(batch)
+                    batch = []
+            if batch:
+                changed += flush(batch)
+            if changed:
+                rollups.rebuild()
+                # cached totals and charts were built from the old amounts
+                bump_data_version()
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {seen} invoice(s), updated {changed}."))
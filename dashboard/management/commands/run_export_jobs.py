@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from dashboard.jobs import claim_next_job, fail_stale_jobs, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs (run as a separate worker process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Process every pending job, then exit.")
+        parser.add_argument("--sleep", type=float, default=2.0,
+                            help="Seconds to wait between polls when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            stale = fail_stale_jobs()
+            if stale:
+                self.stdout.write(self.style.WARNING(f"Marked {stale} abandoned job(s) as failed"))
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            self.stdout.write(f"Running export job {job.pk} ({job.kind}, {job.format})")
+            job = run_export_job(job)
+            if job.status == job.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Job {job.pk} done: {job.rows_done} rows -> {job.file.name}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job {job.pk} failed: {job.error}"))
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_add_performance_indexes'),
+    ]
+
+    operations = [
+        # Composite index for keyset pagination on ('-date', '-id')
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-date', '-id'], name='idx_invoice_date_id'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollup(apps, schema_editor):
+    Invoice = apps.get_model('dashboard', 'Invoice')
+    InvoiceRollup = apps.get_model('dashboard', 'InvoiceRollup')
+    groups = (
+        Invoice.objects.annotate(m=TruncMonth('date'))
+        .values('m', 'remark_id', 'status', 'currency', 'to_party')
+        .annotate(n=Count('id'), total=Sum('amount'))
+        .order_by()
+    )
+    InvoiceRollup.objects.bulk_create(
+        [
+            InvoiceRollup(
+                month=g['m'], remark_id=g['remark_id'], status=g['status'],
+                currency=g['currency'], to_party=g['to_party'],
+                invoice_count=g['n'], amount_sum=g['total'] or 0,
+            )
+            for g in groups
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(choices=[('Unpaid', 'Unpaid'), ('Progress', 'Progress'), ('Paid by MIMS Recoverable', 'Paid by MIMS Recoverable'), ('Paid by MIMS Expense', 'Paid by MIMS Expense'), ('Paid by Fund', 'Paid by Fund')], max_length=60)),
+                ('currency', models.CharField(choices=[('IDR', 'IDR'), ('USD', 'USD'), ('SGD', 'SGD')], max_length=3)),
+                ('to_party', models.CharField(max_length=200)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('remark', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='dashboard.invoiceremarkcategory')),
+            ],
+            options={
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'remark', 'status', 'currency', 'to_party'), name='uniq_rollup_key'), models.UniqueConstraint(condition=models.Q(('remark__isnull', True)), fields=('month', 'status', 'currency', 'to_party'), name='uniq_rollup_key_no_remark')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:17
+
+import datetime
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def seed_rates(apps, schema_editor):
+    # the rates that used to be hard-coded in dashboard/views.py
+    CurrencyRate = apps.get_model('dashboard', 'CurrencyRate')
+    start = datetime.date(2000, 1, 1)
+    CurrencyRate.objects.bulk_create([
+        CurrencyRate(currency='IDR', rate_to_idr=Decimal('1'), effective_from=start),
+        CurrencyRate(currency='USD', rate_to_idr=Decimal('15800'), effective_from=start),
+        CurrencyRate(currency='SGD', rate_to_idr=Decimal('11700'), effective_from=start),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_invoicerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('IDR', 'IDR'), ('USD', 'USD'), ('SGD', 'SGD')], max_length=3)),
+                ('rate_to_idr', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('effective_from', models.DateField()),
+            ],
+            options={
+                'ordering': ['currency', 'effective_from'],
+                'constraints': [models.UniqueConstraint(fields=('currency', 'effective_from'), name='uniq_rate_currency_date')],
+            },
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+    ]
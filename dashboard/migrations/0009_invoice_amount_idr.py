@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:18
+
+from bisect import bisect_right
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_amount_idr(apps, schema_editor):
+    Invoice = apps.get_model('dashboard', 'Invoice')
+    CurrencyRate = apps.get_model('dashboard', 'CurrencyRate')
+    InvoiceRollup = apps.get_model('dashboard', 'InvoiceRollup')
+
+    timeline = {}
+    for cur, eff, rate in CurrencyRate.objects.order_by('currency', 'effective_from').values_list(
+            'currency', 'effective_from', 'rate_to_idr'):
+        dates, rates = timeline.setdefault(cur, ([], []))
+        dates.append(eff)
+        rates.append(rate)
+
+    def rate(cur, on_date):
+        if cur == 'IDR' or cur not in timeline:
+            return Decimal(1)
+        dates, rates = timeline[cur]
+        return rates[max(bisect_right(dates, on_date) - 1, 0)]
+
+    last_id = 0
+    while True:
+        batch = list(Invoice.objects.filter(id__gt=last_id).order_by('id')
+                     .only('id', 'amount', 'currency', 'date')[:2000])
+        if not batch:
+            break
+        for inv in batch:
+            inv.amount_idr = (inv.amount * rate(inv.currency, inv.date)).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP)
+        Invoice.objects.bulk_update(batch, ['amount_idr'])
+        last_id = batch[-1].id
+
+    groups = (
+        Invoice.objects.annotate(m=TruncMonth('date'))
+        .values('m', 'remark_id', 'status', 'currency', 'to_party')
+        .annotate(total=Sum('amount_idr'))
+        .order_by()
+    )
+    for g in groups:
+        InvoiceRollup.objects.filter(
+            month=g['m'], remark_id=g['remark_id'], status=g['status'],
+            currency=g['currency'], to_party=g['to_party'],
+        ).update(amount_idr_sum=g['total'] or 0)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_currencyrate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_idr',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoicerollup',
+            name='amount_idr_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=22),
+        ),
+        migrations.RunPython(backfill_amount_idr, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_dimensions(apps, schema_editor):
+    Invoice = apps.get_model('dashboard', 'Invoice')
+    Product = apps.get_model('dashboard', 'Product')
+    Party = apps.get_model('dashboard', 'Party')
+
+    # one UPDATE per distinct name; the names are the few hundred filter values
+    for name, n in Invoice.objects.values_list('product').annotate(n=Count('id')).order_by():
+        product = Product.objects.create(name=name, invoice_count=n)
+        Invoice.objects.filter(product=name).update(product_ref=product)
+
+    parties = {}
+    for field, ref, counter in (('from_party', 'from_party_ref', 'sent_count'),
+                                ('to_party', 'to_party_ref', 'received_count')):
+        for name, n in Invoice.objects.values_list(field).annotate(n=Count('id')).order_by():
+            party = parties.get(name)
+            if party is None:
+                party = parties[name] = Party.objects.create(name=name)
+            setattr(party, counter, n)
+            Invoice.objects.filter(**{field: name}).update(**{ref: party})
+    Party.objects.bulk_update(parties.values(), ['sent_count', 'received_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_invoice_amount_idr'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Party',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('sent_count', models.IntegerField(default=0)),
+                ('received_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'parties',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('invoice_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='from_party_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sent_invoices', to='dashboard.party'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='to_party_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='received_invoices', to='dashboard.party'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='product_ref',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoices', to='dashboard.product'),
+        ),
+        migrations.RunPython(backfill_dimensions, migrations.RunPython.noop),
+    ]
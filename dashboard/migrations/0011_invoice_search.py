@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from dashboard import search
+
+COLUMNS = ('invoice_number',)
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection, 'dashboard_invoice', COLUMNS)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection, 'dashboard_invoice', COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_product_party_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
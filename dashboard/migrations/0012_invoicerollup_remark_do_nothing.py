@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_invoice_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoicerollup',
+            name='remark',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='dashboard.invoiceremarkcategory'),
+        ),
+    ]
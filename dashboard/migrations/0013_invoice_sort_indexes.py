@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_invoicerollup_remark_do_nothing'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_date_desc',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_status',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_product',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_from',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='idx_invoice_to',
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['amount', 'id'], name='idx_invoice_amount_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_number', 'id'], name='idx_invoice_number_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['product', 'id'], name='idx_invoice_product_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'id'], name='idx_invoice_status_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['currency', 'id'], name='idx_invoice_currency_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['from_party', 'id'], name='idx_invoice_from_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['to_party', 'id'], name='idx_invoice_to_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['uploaded_at', 'id'], name='idx_invoice_uploaded_id'),
+        ),
+    ]
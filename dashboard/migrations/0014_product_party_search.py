@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from dashboard import search
+
+TABLES = ('dashboard_product', 'dashboard_party')
+COLUMNS = ('name',)
+
+
+def install_search(apps, schema_editor):
+    for table in TABLES:
+        search.install(schema_editor.connection, table, COLUMNS)
+
+
+def uninstall_search(apps, schema_editor):
+    for table in TABLES:
+        search.uninstall(schema_editor.connection, table, COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_invoice_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -1,6 +1,9 @@
 # dashboard/models.py
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
 
 CURRENCY_CHOICES = (
     ("IDR", "IDR"),
@@ -33,6 +36,32 @@ class InvoiceRemarkCategory(models.Model):
         return self.name
 
 
+class Product(models.Model):
+    """Distinct Invoice.product values; invoice_count is kept up to date by Invoice.save()/delete()."""
+    name = models.CharField(max_length=200, unique=True)
+    invoice_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class Party(models.Model):
+    """Distinct sender/receiver names, with how many invoices use each side."""
+    name = models.CharField(max_length=200, unique=True)
+    sent_count = models.IntegerField(default=0)
+    received_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name_plural = "parties"
+
+    def __str__(self):
+        return self.name
+
+
 def invoice_upload_path(instance, filename):
     return f"invoices/{instance.date:%Y/%m/%d}/{filename}"
 
@@ -45,18 +74,99 @@ class Invoice(models.Model):
     invoice_number = models.CharField(max_length=120)
     amount = models.DecimalField(max_digits=14, decimal_places=2)
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default="IDR")
+    # amount converted to IDR at the rate in force on `date`; set in save()
+    # and by `manage.py recompute_amount_idr`, so totals are a plain SUM()
+    amount_idr = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     status = models.CharField(max_length=60, choices=STATUS_CHOICES, default="Unpaid")
     from_party = models.CharField(max_length=200)
     to_party = models.CharField(max_length=200)
     file = models.FileField(upload_to=invoice_upload_path, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # the product / party names as dimension rows, set in save(); filters
+    # compare these integer keys instead of the 200-char strings
+    product_ref = models.ForeignKey(
+        Product, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name="invoices"
+    )
+    from_party_ref = models.ForeignKey(
+        Party, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name="sent_invoices"
+    )
+    to_party_ref = models.ForeignKey(
+        Party, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name="received_invoices"
+    )
 
     class Meta:
         ordering = ["-uploaded_at"]
+        indexes = [
+            models.Index(fields=["remark"], name="idx_invoice_remark"),
+            models.Index(fields=["status", "date"], name="idx_status_date"),
+            models.Index(fields=["remark", "date"], name="idx_remark_date"),
+            # keyset pagination on the default table order; also serves
+            # lookups and sorts on date alone, in either direction
+            models.Index(fields=["-date", "-id"], name="idx_invoice_date_id"),
+            # keyset pagination on the other api_invoices sorts (either
+            # direction); the leading column also serves equality filters
+            models.Index(fields=["amount", "id"], name="idx_invoice_amount_id"),
+            models.Index(fields=["invoice_number", "id"], name="idx_invoice_number_id"),
+            models.Index(fields=["product", "id"], name="idx_invoice_product_id"),
+            models.Index(fields=["status", "id"], name="idx_invoice_status_id"),
+            models.Index(fields=["currency", "id"], name="idx_invoice_currency_id"),
+            models.Index(fields=["from_party", "id"], name="idx_invoice_from_id"),
+            models.Index(fields=["to_party", "id"], name="idx_invoice_to_id"),
+            models.Index(fields=["uploaded_at", "id"], name="idx_invoice_uploaded_id"),
+        ]
 
     def __str__(self):
         return f"{self.product} - {self.invoice_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_refs = instance._dimension_refs()
+        instance._saved_rollup = instance._loaded_rollup()
+        return instance
+
+    def _loaded_rollup(self):
+        """rollups.invoice_snapshot() of the loaded row, or None when some of its fields were deferred."""
+        from . import rollups
+        if any(f not in self.__dict__ for f in rollups.SNAPSHOT_FIELDS):
+            return None
+        return rollups.invoice_snapshot(self)
+
+    def _dimension_refs(self):
+        return tuple(self.__dict__.get(f) for f in ("product_ref_id", "from_party_ref_id", "to_party_ref_id"))
+
+    def save(self, *args, **kwargs):
+        from . import dimensions, rollups
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"amount", "currency", "date"} & set(update_fields):
+            from .rates import amounts_in_idr
+            self.amount_idr = amounts_in_idr([(self.amount, self.currency, self.date)])[0]
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"amount_idr"}
+
+        with transaction.atomic():
+            if update_fields is None or {"product", "from_party", "to_party"} & set(update_fields):
+                self.product_ref_id, self.from_party_ref_id, self.to_party_ref_id = dimensions.resolve(
+                    self.product, self.from_party, self.to_party
+                )
+                if update_fields is not None:
+                    kwargs["update_fields"] = set(kwargs["update_fields"]) | {
+                        "product_ref", "from_party_ref", "to_party_ref"
+                    }
+            before = getattr(self, "_saved_refs", (None, None, None))
+            rollup_before = getattr(self, "_saved_rollup", None)
+            if rollup_before is None and self.pk is not None:
+                # deferred fields, or an instance built with an existing pk
+                rollup_before = rollups.stored_snapshot(self.pk)
+            super().save(*args, **kwargs)
+            after = self._dimension_refs()
+            dimensions.move_refs(before, after)
+            self._saved_refs = after
+            rollup_after = rollups.invoice_snapshot(self)
+            rollups.record_change(before=rollup_before, after=rollup_after)
+            self._saved_rollup = rollup_after
+
     @property
     def download_filename(self) -> str:
         r = (self.remark.name if self.remark else "-").replace(" ", "_")
@@ -65,3 +175,133 @@ class Invoice(models.Model):
         t = self.to_party.replace(" ", "_")
         base = f"{self.date:%Y%m%d}-{p}-{self.status}-{r}-{f}_to_{t}"
         return f"{base}{self.file.name[self.file.name.rfind('.'):]}"
+
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, **kwargs):
+    """Release the deleted invoice's product / party references and rollup counts."""
+    from . import dimensions, rollups
+    dimensions.move_refs(instance._dimension_refs(), (None, None, None))
+    rollups.record_change(before=getattr(instance, "_saved_rollup", None) or rollups.invoice_snapshot(instance))
+
+
+class CurrencyRate(models.Model):
+    """IDR value of one unit of `currency`, valid from `effective_from` until the next row."""
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES)
+    rate_to_idr = models.DecimalField(max_digits=18, decimal_places=6)
+    effective_from = models.DateField()
+
+    class Meta:
+        ordering = ["currency", "effective_from"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency", "effective_from"], name="uniq_rate_currency_date"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.currency} = {self.rate_to_idr} IDR from {self.effective_from}"
+
+
+@receiver([post_save, post_delete], sender=CurrencyRate)
+def currency_rates_changed(sender, **kwargs):
+    """Make every process reload its rate table after the change commits."""
+    from .rates import bump_rates_version
+    bump_rates_version()
+
+
+class InvoiceRollup(models.Model):
+    """
+    Invoice counts and amount sums per (month, remark, status, currency,
+    receiver). Invoice.save() and invoice deletes keep it in step; bulk
+    writes that bypass them apply their own deltas (see dashboard.rollups).
+    Rebuilt/verified with `manage.py rebuild_rollups [--verify]`.
+    """
+    month = models.DateField()
+    # rows of a deleted remark move to the no-remark bucket, as its invoices
+    # do (Invoice.remark is SET_NULL); see remark_deleting below
+    remark = models.ForeignKey(
+        InvoiceRemarkCategory, on_delete=models.DO_NOTHING, null=True, blank=True
+    )
+    status = models.CharField(max_length=60, choices=STATUS_CHOICES)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES)
+    to_party = models.CharField(max_length=200)
+    invoice_count = models.IntegerField(default=0)
+    amount_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    amount_idr_sum = models.DecimalField(max_digits=22, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "remark", "status", "currency", "to_party"],
+                name="uniq_rollup_key",
+            ),
+            # NULLs are distinct in unique indexes, so rows without a remark need their own
+            models.UniqueConstraint(
+                fields=["month", "status", "currency", "to_party"],
+                condition=models.Q(remark__isnull=True),
+                name="uniq_rollup_key_no_remark",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.status} {self.currency} {self.to_party}: {self.invoice_count}"
+
+
+@receiver(pre_delete, sender=InvoiceRemarkCategory)
+def remark_deleting(sender, instance, **kwargs):
+    """Move the remark's rollup rows to the no-remark bucket before it goes."""
+    from . import rollups
+    rollups.move_remark(instance.pk)
+
+
+def export_upload_path(instance, filename):
+    return f"exports/{instance.created_at:%Y/%m/%d}/{filename}"
+
+class ExportJob(models.Model):
+    """An export run by the `run_export_jobs` worker instead of inside a request."""
+
+    class Kind(models.TextChoices):
+        INVOICES = "INVOICES", "Invoices"
+        LOG = "LOG", "Activity Log"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    format = models.CharField(max_length=16, default="xlsx")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    file = models.FileField(upload_to=export_upload_path, null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True, blank=True, on_delete=models.SET_NULL, related_name="export_jobs"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="idx_exportjob_status"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} export #{self.pk} ({self.status})"
+
+    @property
+    def progress(self) -> float:
+        if self.status == self.Status.DONE:
+            return 1.0
+        if not self.rows_total:
+            return 0.0
+        return min(self.rows_done / self.rows_total, 1.0)
@@ -0,0 +1,133 @@
+# dashboard/pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are addressed by the sort key of the last row seen instead of an
+OFFSET, so every page is a single index range scan no matter how deep the
+client has scrolled.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Malformed cursor")
+    return payload
+
+
+def _split(order):
+    """'-date' -> ('date', True)"""
+    return (order[1:], True) if order.startswith("-") else (order, False)
+
+
+def keyset_q(ordering, values, forward=True):
+    """
+    Build the WHERE clause selecting rows strictly after `values` in
+    `ordering` (or strictly before when forward=False), e.g. for
+    ('-date', '-id'):  date <= d AND (date < d OR (date = d AND id < i))
+
+    The leading bound is implied by the OR chain, but without it the
+    database reads the index from its start on every page instead of
+    seeking to the cursor.
+    """
+    q = Q()
+    for i, order in enumerate(ordering):
+        field, desc = _split(order)
+        after_desc = desc if forward else not desc
+        lookup = "lt" if after_desc else "gt"
+        clause = Q(**{f"{field}__{lookup}": values[i]})
+        for prev_order, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{_split(prev_order)[0]: prev_value})
+        q |= clause
+    field, desc = _split(ordering[0])
+    bound = "lte" if (desc if forward else not desc) else "gte"
+    return Q(**{f"{field}__{bound}": values[0]}) & q
+
+
+def _reverse(ordering):
+    return [o[1:] if o.startswith("-") else f"-{o}" for o in ordering]
+
+
+def keyset_page(qs, ordering, limit, cursor=None, key_fn=None, tag=None):
+    """
+    Return (rows, next_cursor, prev_cursor) for one page of `qs`.
+
+    `qs` should be a values() queryset containing every field in `ordering`.
+    `cursor` is a decoded cursor payload ({"k": [...], "d": "next"|"prev"}).
+    `key_fn(field, raw)` converts a cursor value back to a python value.
+    `tag` is stored in the cursors and must match on the way back in, so a
+    cursor issued for one sort order cannot be replayed against another.
+    """
+    ordering = list(ordering)
+    fields = [_split(o)[0] for o in ordering]
+    forward = True
+    if cursor:
+        if cursor.get("t") != tag:
+            raise InvalidCursor("Cursor does not match sort order")
+        keys = cursor.get("k")
+        if not isinstance(keys, list) or len(keys) != len(fields):
+            raise InvalidCursor("Cursor does not match sort order")
+        if key_fn:
+            try:
+                keys = [key_fn(f, v) for f, v in zip(fields, keys)]
+            except Exception:
+                raise InvalidCursor("Malformed cursor")
+        forward = cursor.get("d", "next") != "prev"
+        qs = qs.filter(keyset_q(ordering, keys, forward=forward))
+
+    qs = qs.order_by(*(ordering if forward else _reverse(ordering)))
+    rows = list(qs[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    def _cursor(row, direction):
+        return encode_cursor({"k": [row[f] for f in fields], "d": direction, "t": tag})
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = _cursor(rows[-1], "next")
+        if cursor and (forward or has_more):
+            prev_cursor = _cursor(rows[0], "prev")
+    return rows, next_cursor, prev_cursor
+
+
+def keyset_iterator(qs, ordering, chunk_size=2000):
+    """
+    Yield every row of `qs` (a values() queryset) in `ordering`, fetching
+    `chunk_size` rows per query with a keyset WHERE clause.
+
+    Unlike QuerySet.iterator() this keeps memory flat even when server-side
+    cursors are disabled (DISABLE_SERVER_SIDE_CURSORS on the pooled Postgres
+    connection makes iterator() buffer the whole result in the client).
+    """
+    ordering = list(ordering)
+    fields = [_split(o)[0] for o in ordering]
+    qs = qs.order_by(*ordering)
+    page = qs
+    while True:
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+        page = qs.filter(keyset_q(ordering, [last[f] for f in fields]))
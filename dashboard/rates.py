@@ -0,0 +1,103 @@
+# dashboard/rates.py
+"""
+Currency rate lookup.
+
+The whole CurrencyRate timeline is small, so each process loads it once and
+keeps it in memory, stamped with the RATES data version (see caching.py).
+The version is bumped whenever a rate changes; the next lookup in any
+process sees the new stamp and reloads. Conversions take batches of (amount, currency, date) so callers
+pay one version check per batch, not per row.
+"""
+from bisect import bisect_right
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from .caching import INVOICES, RATES, bump_data_version, data_version
+
+# used when the rate table is empty (fresh database, tests)
+DEFAULT_RATES = {
+    "IDR": Decimal("1"),
+    "USD": Decimal("15800"),
+    "SGD": Decimal("11700"),
+}
+
+
+class RateTable:
+    def __init__(self, rows, version=None):
+        """`rows`: iterable of (currency, effective_from, rate_to_idr), any order."""
+        self.version = version
+        timeline = {}
+        for cur, eff, rate in sorted(rows, key=lambda r: (r[0], r[1])):
+            dates, rates = timeline.setdefault(cur, ([], []))
+            dates.append(eff)
+            rates.append(Decimal(rate))
+        self._timeline = timeline
+
+    def rate(self, currency, on_date=None):
+        """IDR per unit of `currency` on `on_date` (latest rate when None)."""
+        if currency == "IDR":
+            return Decimal(1)
+        line = self._timeline.get(currency)
+        if not line:
+            return DEFAULT_RATES.get(currency, Decimal(1))
+        dates, rates = line
+        if on_date is None:
+            return rates[-1]
+        # before the first effective date, fall back to the oldest known rate
+        i = bisect_right(dates, on_date) - 1
+        return rates[max(i, 0)]
+
+    def convert_many(self, items, to_currency):
+        """
+        Convert [(amount, currency, date), ...] into `to_currency`, using the
+        rates in force on each row's date for both legs. Returns Decimals.
+        """
+        memo = {}
+        out = []
+        for amount, currency, on_date in items:
+            if isinstance(on_date, datetime):
+                on_date = on_date.date()
+            key = (currency, on_date)
+            factor = memo.get(key)
+            if factor is None:
+                factor = memo[key] = self.rate(currency, on_date) / self.rate(to_currency, on_date)
+            out.append(Decimal(amount or 0) * factor)
+        return out
+
+
+_table = None
+
+
+def _load(version):
+    from .models import CurrencyRate
+    rows = CurrencyRate.objects.values_list("currency", "effective_from", "rate_to_idr")
+    return RateTable(list(rows), version=version)
+
+
+def get_rate_table():
+    """Process-wide RateTable, reloaded when the RATES data version changes."""
+    global _table
+    version = data_version(RATES)
+    if _table is None or _table.version != version:
+        _table = _load(version)
+    return _table
+
+
+def bump_rates_version():
+    # converted chart values depend on the rates too
+    bump_data_version(RATES)
+    bump_data_version(INVOICES)
+
+
+CENT = Decimal("0.01")
+
+
+def amounts_in_idr(items):
+    """
+    Base-currency (IDR) values for [(amount, currency, date), ...], rounded
+    to cents, as stored in Invoice.amount_idr.
+    """
+    return [
+        v.quantize(CENT, rounding=ROUND_HALF_UP)
+        for v in get_rate_table().convert_many(items, "IDR")
+    ]
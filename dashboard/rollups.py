@@ -0,0 +1,161 @@
+# dashboard/rollups.py
+"""
+Maintenance of the InvoiceRollup table.
+
+Every invoice write turns into one or two deltas on (month, remark, status,
+currency, to_party). Invoice.save() and invoice deletes apply them in the
+write's transaction (see models.py), so views, the admin and the shell all
+keep the rollup in step. Bulk writes that skip save() - QuerySet.update(),
+bulk_create(), raw SQL (batch.py, imports.py) - must apply their deltas
+themselves, or run `manage.py rebuild_rollups` afterwards.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Invoice, InvoiceRollup
+
+KEY_FIELDS = ("month", "remark_id", "status", "currency", "to_party")
+
+
+def rollup_key(month, remark_id, status, currency, to_party):
+    return (month.replace(day=1), remark_id, status, currency, to_party)
+
+
+SNAPSHOT_FIELDS = ("date", "remark_id", "status", "currency", "to_party", "amount", "amount_idr")
+
+
+def snapshot(values):
+    """(key, amount, amount_idr) from a {field: value} dict with SNAPSHOT_FIELDS."""
+    on_date = Invoice._meta.get_field("date").to_python(values["date"])
+    key = rollup_key(on_date, values["remark_id"], values["status"], values["currency"], values["to_party"])
+    return key, Decimal(values["amount"]), Decimal(values["amount_idr"] or 0)
+
+
+def invoice_snapshot(inv):
+    """(key, amount, amount_idr) of an invoice as it is now; take it before changing the instance."""
+    return snapshot({f: getattr(inv, f) for f in SNAPSHOT_FIELDS})
+
+
+def stored_snapshot(pk):
+    """invoice_snapshot() of the row as it is in the database, or None if there is none."""
+    row = Invoice.objects.filter(pk=pk).values(*SNAPSHOT_FIELDS).first()
+    return snapshot(row) if row else None
+
+
+def _apply_one(key, count, amount, amount_idr):
+    lookup = dict(zip(KEY_FIELDS, key))
+    changes = {
+        "invoice_count": F("invoice_count") + count,
+        "amount_sum": F("amount_sum") + amount,
+        "amount_idr_sum": F("amount_idr_sum") + amount_idr,
+    }
+    updated = InvoiceRollup.objects.filter(**lookup).update(**changes)
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                InvoiceRollup.objects.create(
+                    invoice_count=count, amount_sum=amount, amount_idr_sum=amount_idr, **lookup
+                )
+        except IntegrityError:
+            # another writer created the row first
+            InvoiceRollup.objects.filter(**lookup).update(**changes)
+    if count < 0:
+        InvoiceRollup.objects.filter(invoice_count__lte=0, **lookup).delete()
+
+
+def apply_deltas(deltas):
+    """Apply {key: (count, amount, amount_idr)} deltas; keys with no net change are skipped."""
+    with transaction.atomic():
+        for key, (count, amount, amount_idr) in deltas.items():
+            if count or amount or amount_idr:
+                _apply_one(key, count, amount, amount_idr)
+
+
+def record_change(before=None, after=None):
+    """
+    Apply the rollup change for one invoice write.
+    `before`/`after` are invoice_snapshot() values (None for create/delete).
+    """
+    deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    if before:
+        key, amount, amount_idr = before
+        c, a, i = deltas[key]
+        deltas[key] = (c - 1, a - amount, i - amount_idr)
+    if after:
+        key, amount, amount_idr = after
+        c, a, i = deltas[key]
+        deltas[key] = (c + 1, a + amount, i + amount_idr)
+    apply_deltas(deltas)
+
+
+def move_remark(remark_id):
+    """Fold the rows of `remark_id` into the matching no-remark rows (the remark is being deleted)."""
+    deltas = defaultdict(lambda: (0, Decimal(0), Decimal(0)))
+    rows = InvoiceRollup.objects.filter(remark_id=remark_id).values(
+        *KEY_FIELDS, "invoice_count", "amount_sum", "amount_idr_sum"
+    )
+    for r in rows:
+        key = tuple(r[f] for f in KEY_FIELDS)
+        no_remark = rollup_key(r["month"], None, r["status"], r["currency"], r["to_party"])
+        n, total, total_idr = r["invoice_count"], r["amount_sum"], r["amount_idr_sum"]
+        deltas[key] = (-n, -total, -total_idr)
+        c, a, i = deltas[no_remark]
+        deltas[no_remark] = (c + n, a + total, i + total_idr)
+    apply_deltas(deltas)
+    # rows whose sums drifted away from a zero count
+    InvoiceRollup.objects.filter(remark_id=remark_id).delete()
+
+
+def compute_from_invoices():
+    """{key: (count, amount, amount_idr)} computed from scratch with one GROUP BY."""
+    groups = (
+        Invoice.objects.annotate(m=TruncMonth("date"))
+        .values("m", "remark_id", "status", "currency", "to_party")
+        .annotate(n=Count("id"), total=Sum("amount"), total_idr=Sum("amount_idr"))
+        .order_by()
+    )
+    return {
+        rollup_key(g["m"], g["remark_id"], g["status"], g["currency"], g["to_party"]):
+            (g["n"], g["total"] or Decimal(0), g["total_idr"] or Decimal(0))
+        for g in groups
+    }
+
+
+def current_rollup():
+    return {
+        tuple(r[f] for f in KEY_FIELDS): (r["invoice_count"], r["amount_sum"], r["amount_idr_sum"])
+        for r in InvoiceRollup.objects.values(*KEY_FIELDS, "invoice_count", "amount_sum", "amount_idr_sum")
+    }
+
+
+def rebuild(batch_size=1000):
+    """Replace the whole rollup table with freshly computed rows; returns the row count."""
+    expected = compute_from_invoices()
+    with transaction.atomic():
+        InvoiceRollup.objects.all().delete()
+        InvoiceRollup.objects.bulk_create(
+            [
+                InvoiceRollup(invoice_count=n, amount_sum=total, amount_idr_sum=total_idr,
+                              **dict(zip(KEY_FIELDS, key)))
+                for key, (n, total, total_idr) in expected.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(expected)
+
+
+def verify():
+    """Return a list of (key, expected, actual) for every mismatching rollup row."""
+    expected = compute_from_invoices()
+    actual = current_rollup()
+    problems = []
+    for key in expected.keys() | actual.keys():
+        e = expected.get(key, (0, Decimal(0), Decimal(0)))
+        a = actual.get(key, (0, Decimal(0), Decimal(0)))
+        if e[0] != a[0] or Decimal(e[1]) != Decimal(a[1]) or Decimal(e[2]) != Decimal(a[2]):
+            problems.append((key, e, a))
+    return problems
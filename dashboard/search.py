@@ -0,0 +1,201 @@
+# dashboard/search.py
+"""
+Index-backed substring search.
+
+PostgreSQL: `col ILIKE %q%` (Django's icontains, i.e. UPPER(col::text) LIKE
+UPPER(%q%)) served by GIN trigram indexes on UPPER(col::text).
+
+SQLite: an external-content FTS5 table with the trigram tokenizer, kept in
+step with the base table by triggers. A phrase query over trigrams that
+occur in nearly every row (shared prefixes such as "INV-2024-") has to
+walk their whole doclists, so the MATCH uses only the few rarest trigrams
+of the term (document counts from an fts5vocab table, cached) and the
+candidates are re-checked with LIKE. Terms shorter than 3 characters, or
+whose every trigram is very common, fall back to a LIKE scan, which
+finds a first page quickly because the matches are dense.
+
+The indexes are created by migrations (install()). A SQLite table rebuild
+drops the triggers, so the post_migrate hook re-installs them.
+"""
+from functools import reduce
+import operator
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# model label -> columns with a search index
+SEARCH_COLUMNS = {
+    "dashboard.Invoice": ("invoice_number",),
+    "dashboard.Product": ("name",),
+    "dashboard.Party": ("name",),
+    "log.LogEntry": ("details", "entity_label", "username_cache"),
+}
+
+FTS_MIN_LENGTH = 3
+# trigrams ANDed in the MATCH
+FTS_MATCH_TRIGRAMS = 3
+# above this many rows for the rarest trigram the FTS doesn't narrow enough
+FTS_DENSE_DOCS = 100_000
+# document counts only steer the choice of trigrams, so they can be old
+DOC_COUNT_TTL = 86400
+
+_fts_tables = {}
+
+
+def fts_table(db_table):
+    return f"{db_table}_fts"
+
+
+def _sqlite_statements(db_table, columns):
+    fts = fts_table(db_table)
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{db_table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts}_vocab USING fts5vocab({fts}, row)",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {db_table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {db_table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _installed_triggers(cursor, db_table):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+        [db_table, f"{fts_table(db_table)}_%"],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def install(connection, db_table, columns):
+    """Create the search index for `db_table`; idempotent."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for col in columns:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {db_table}_{col}_trgm "
+                    f"ON {db_table} USING gin ((UPPER({col}::text)) gin_trgm_ops)"
+                )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            if len(_installed_triggers(cursor, db_table)) == 3:
+                return
+            for sql in _sqlite_statements(db_table, columns):
+                cursor.execute(sql)
+            # (re)index rows written while the triggers were missing
+            fts = fts_table(db_table)
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    _fts_tables.clear()
+
+
+def uninstall(connection, db_table, columns):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for col in columns:
+                cursor.execute(f"DROP INDEX IF EXISTS {db_table}_{col}_trgm")
+        elif connection.vendor == "sqlite":
+            fts = fts_table(db_table)
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {fts}_vocab")
+            cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+    _fts_tables.clear()
+
+
+def install_all(using="default", **kwargs):
+    """post_migrate hook: make sure every search index (and its triggers) exists."""
+    from django.apps import apps
+
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    for label, columns in SEARCH_COLUMNS.items():
+        model = apps.get_model(label)
+        if model._meta.db_table in tables:
+            install(connection, model._meta.db_table, columns)
+
+
+# ---------- querying ----------
+def _has_fts(connection, db_table):
+    key = (connection.alias, connection.settings_dict["NAME"], db_table)
+    if key not in _fts_tables:
+        _fts_tables[key] = fts_table(db_table) in connection.introspection.table_names()
+    return _fts_tables[key]
+
+
+def _trigrams(q):
+    # the tokenizer folds case; for ASCII, str.lower() folds the same way
+    q = q.lower()
+    return sorted({q[i:i + 3] for i in range(len(q) - 2)})
+
+
+def _doc_count_key(fts, trigram):
+    return f"fts_docs:{fts}:{trigram.encode().hex()}"
+
+
+def _doc_counts(connection, fts, trigrams):
+    """{trigram: number of rows containing it}, from the cache or the fts5vocab table."""
+    keys = {t: _doc_count_key(fts, t) for t in trigrams}
+    cached = cache.get_many(keys.values())
+    counts = {t: cached[k] for t, k in keys.items() if k in cached}
+    missing = [t for t in trigrams if t not in counts]
+    if missing:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT term, doc FROM {fts}_vocab WHERE term IN ({', '.join(['%s'] * len(missing))})",
+                missing,
+            )
+            found = dict(cursor.fetchall())
+        fresh = {t: found.get(t, 0) for t in missing}
+        cache.set_many({keys[t]: n for t, n in fresh.items()}, DOC_COUNT_TTL)
+        counts.update(fresh)
+    return counts
+
+
+def forget_doc_counts(model, terms):
+    """Drop the cached document counts of the trigrams of `terms` for `model`'s search table."""
+    fts = fts_table(model._meta.db_table)
+    cache.delete_many([_doc_count_key(fts, t) for q in terms for t in _trigrams(q)])
+
+
+def _like_q(columns, q):
+    return reduce(operator.or_, (Q(**{f"{col}__icontains": q}) for col in columns))
+
+
+def search_q(model, q, using="default", columns=None, dense_docs=FTS_DENSE_DOCS):
+    """
+    Q matching rows of `model` whose indexed columns (or the given subset of
+    them) contain `q` (case-insensitive). Above `dense_docs` rows for the
+    rarest trigram a LIKE scan is used instead of the FTS table.
+    """
+    indexed = SEARCH_COLUMNS[model._meta.label]
+    columns = tuple(columns or indexed)
+    connection = connections[using]
+    db_table = model._meta.db_table
+    if connection.vendor != "sqlite" or len(q) < FTS_MIN_LENGTH or not _has_fts(connection, db_table):
+        return _like_q(columns, q)
+
+    fts = fts_table(db_table)
+    if q.isascii():
+        counts = _doc_counts(connection, fts, _trigrams(q))
+        # the counts may be stale; they only pick the trigrams, the MATCH
+        # and the LIKE re-check decide what matches
+        rarest = sorted(counts, key=counts.get)[:FTS_MATCH_TRIGRAMS]
+        if counts[rarest[0]] > dense_docs:
+            return _like_q(columns, q)
+        match = " ".join('"' + t.replace('"', '""') + '"' for t in rarest)
+    else:
+        match = '"' + q.replace('"', '""') + '"'
+    if columns != indexed:
+        match = "{" + " ".join(columns) + "} : (" + match + ")"
+    # the trigrams may match in different places or columns: re-check with LIKE
+    candidates = RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match])
+    return Q(pk__in=candidates) & _like_q(columns, q)
@@ -1,3 +1,198 @@
+import datetime
+import re
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from . import rates, rollups
+from .models import Invoice, InvoiceRemarkCategory, Party, Product
+from .pagination import encode_cursor, keyset_iterator, keyset_q
+
+
+class InvoiceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        rates._table = None
+        cls.user = User.objects.create_user("tester", password="pw")
+        cls.ops = InvoiceRemarkCategory.objects.create(name="Ops", order=1)
+        cls.travel = InvoiceRemarkCategory.objects.create(name="Travel", order=2)
+        for i in range(30):
+            Invoice.objects.create(
+                product=f"Product {i % 4}",
+                date=datetime.date(2024, 1 + i % 12, 1 + i % 20),
+                remark=cls.ops if i % 2 else cls.travel,
+                invoice_number=f"INV-{i:03d}",
+                amount=Decimal(100 + i * 7),
+                currency=("IDR", "USD", "SGD")[i % 3],
+                status=("Unpaid", "Progress", "Paid by Fund")[i % 3],
+                from_party=f"Sender {i % 3}",
+                to_party=f"Receiver {i % 5}",
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+
+class KeysetQueryTests(InvoiceTestCase):
+    def _plan(self, ordering):
+        fields = [o.lstrip("-") for o in ordering]
+        qs = Invoice.objects.order_by(*ordering).values(*fields)
+        last = qs[10]
+        return qs.filter(keyset_q(ordering, [last[f] for f in fields]))[:5].explain()
+
+    @skipUnless(connection.vendor == "sqlite", "checks the SQLite query plan")
+    def test_page_seeks_to_the_cursor(self):
+        # a range SEARCH on the leading column, not a SCAN from the top of the index
+        for ordering, bound in ((("-date", "-id"), "date<?"), (("amount", "id"), "amount>?")):
+            plan = self._plan(ordering)
+            self.assertRegex(plan, rf"SEARCH dashboard_invoice USING (COVERING )?INDEX \w+ \({re.escape(bound)}\)")
+            self.assertNotIn("SCAN dashboard_invoice", plan)
+
+    def test_pages_cover_every_row_once(self):
+        for ordering in (("-date", "-id"), ("amount", "id"), ("-status", "-id")):
+            fields = [o.lstrip("-") for o in ordering]
+            qs = Invoice.objects.order_by(*ordering).values(*fields)
+            seen, page = [], list(qs[:7])
+            while page:
+                seen += [r["id"] for r in page]
+                last = page[-1]
+                page = list(qs.filter(keyset_q(ordering, [last[f] for f in fields]))[:7])
+            self.assertEqual(seen, [r["id"] for r in qs])
+
+
+class KeysetIteratorTests(InvoiceTestCase):
+    def test_chunks_seek_past_the_previous_one(self):
+        qs = Invoice.objects.values("id", "date")
+        with CaptureQueriesContext(connection) as ctx:
+            ids = [r["id"] for r in keyset_iterator(qs, ("-date", "-id"), chunk_size=4)]
+        self.assertEqual(ids, list(Invoice.objects.order_by("-date", "-id").values_list("id", flat=True)))
+        # every chunk after the first starts from a bound on the leading column
+        for query in ctx.captured_queries[1:]:
+            self.assertIn('"date" <=', query["sql"])
+
+
+class InvoiceCursorTests(InvoiceTestCase):
+    def test_malformed_cursor_is_a_400(self):
+        for sort, keys in (("-date", [None, None]), ("amount", [None, None]),
+                           ("-date", [["2024-01-01"], 1]), ("amount", [{"a": 1}, 1]), ("-date", ["", 1])):
+            cursor = encode_cursor({"k": keys, "d": "next", "t": sort})
+            r = self.client.get("/dashboard/api/invoices/", {"sort": sort, "cursor": cursor}, secure=True)
+            self.assertEqual(r.status_code, 400, (sort, keys))
+            self.assertFalse(r.json()["ok"])
+
+    def test_cursor_pages(self):
+        first = self.client.get("/dashboard/api/invoices/", {"sort": "amount", "limit": 10}, secure=True).json()
+        second = self.client.get(
+            "/dashboard/api/invoices/", {"sort": "amount", "limit": 10, "cursor": first["next"]}, secure=True
+        ).json()
+        numbers = [r["invoice_number"] for r in first["items"] + second["items"]]
+        expected = Invoice.objects.order_by("amount", "id").values_list("invoice_number", flat=True)[:20]
+        self.assertEqual(numbers, list(expected))
+
+
+class ChartCurrencyTests(InvoiceTestCase):
+    url = "/dashboard/api/charts/"
+
+    def _total(self, params):
+        return sum(self.client.get(self.url, params, secure=True).json()["amount_by_period"]["values"])
+
+    def test_legacy_currency_is_the_target(self):
+        with self.assertLogs("dashboard.views", "WARNING"):
+            legacy = self.client.get(self.url, {"currency": "USD"}, secure=True).json()
+        self.assertEqual(legacy["currency"], "USD")
+        self.assertAlmostEqual(
+            sum(legacy["amount_by_period"]["values"]), self._total({"convert_to": "USD"}), places=2
+        )
+
+    def test_currency_filters_with_convert_to(self):
+        native = float(sum(Invoice.objects.filter(currency="USD").values_list("amount", flat=True)))
+        self.assertAlmostEqual(self._total({"currency": "USD", "convert_to": "USD"}), native, places=2)
+
+
+class RollupInvariantTests(InvoiceTestCase):
+    """Every write path leaves InvoiceRollup and the reference counts matching the invoice table."""
+
+    def assertInStep(self):
+        self.assertEqual(rollups.verify(), [])
+        for model, field, ref in ((Product, "invoice_count", "product_ref"),
+                                  (Party, "sent_count", "from_party_ref"),
+                                  (Party, "received_count", "to_party_ref")):
+            expected = {
+                r[ref]: r["n"] for r in Invoice.objects.values(ref).annotate(n=Count("id")).order_by()
+            }
+            for pk, count in model.objects.values_list("pk", field):
+                self.assertEqual(count, expected.get(pk, 0), (model.__name__, field, pk))
+
+    def _post(self, url, data, **extra):
+        r = self.client.post(url, data, secure=True, **extra)
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_seeded_data(self):
+        self.assertInStep()
+
+    def test_single_invoice_views(self):
+        self._post("/dashboard/api/invoice/create/", {
+            "product": "Product 9", "date": "2024-03-05", "remark_id": self.ops.pk,
+            "invoice_number": "INV-900", "amount": "250", "currency": "USD", "status": "Unpaid",
+            "from_party": "Sender 9", "to_party": "Receiver 9", "file_key": "invoices/inv-900.pdf",
+        })
+        self.assertInStep()
+        inv = Invoice.objects.get(invoice_number="INV-900")
+        self._post(f"/dashboard/api/invoice/{inv.pk}/update/", {
+            "date": "2024-04-05", "remark_id": self.travel.pk, "amount": "300",
+            "currency": "SGD", "to_party": "Receiver 1",
+        })
+        self.assertInStep()
+        self._post(f"/dashboard/api/invoice/{inv.pk}/status/", {"status": "Progress"})
+        self.assertInStep()
+        self._post(f"/dashboard/api/invoice/{inv.pk}/delete/", {})
+        self.assertInStep()
+
+    def test_batch_views(self):
+        ids = ",".join(str(pk) for pk in Invoice.objects.order_by("id").values_list("id", flat=True)[:12])
+        self._post("/dashboard/api/invoices/batch/status/", {"ids": ids, "set_status": "Progress"})
+        self.assertInStep()
+        self._post("/dashboard/api/invoices/batch/update/", {"ids": ids, "set_to_party": "Receiver 7"})
+        self.assertInStep()
+        self._post("/dashboard/api/invoices/batch/delete/", {"ids": ids})
+        self.assertInStep()
+
+    def test_import(self):
+        csv = (
+            "Product,Date,Invoice Remarks,Invoice Number,Amount,Currency,Status,From,To\n"
+            "Product 1,2024-02-03,Ops,INV-800,120,IDR,Unpaid,Sender 1,Receiver 8\n"
+            "Product 8,2024-05-06,Travel,INV-801,75.5,USD,Progress,Sender 8,Receiver 2\n"
+        )
+        result = self._post("/dashboard/api/invoice/import/", {
+            "file": SimpleUploadedFile("invoices.csv", csv.encode(), content_type="text/csv"),
+        })
+        self.assertEqual(result["created"], 2)
+        self.assertInStep()
 
-# Create your tests here.
+    def test_orm_writes(self):
+        # the admin and the shell go through save() / delete() too
+        inv = Invoice.objects.create(
+            product="Product 5", date=datetime.date(2024, 6, 7), remark=self.ops, invoice_number="INV-700",
+            amount=Decimal("42"), currency="USD", status="Unpaid", from_party="Sender 5", to_party="Receiver 5",
+        )
+        self.assertInStep()
+        inv.date, inv.status, inv.amount = datetime.date(2024, 7, 1), "Progress", Decimal("50")
+        inv.save()
+        self.assertInStep()
+        deferred = Invoice.objects.only("id", "status").get(pk=inv.pk)
+        deferred.status = "Paid by Fund"
+        deferred.save(update_fields=["status"])
+        self.assertInStep()
+        Invoice.objects.get(pk=inv.pk).delete()
+        self.assertInStep()
+        Invoice.objects.filter(currency="SGD").delete()
+        self.assertInStep()
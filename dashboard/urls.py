@@ -2,6 +2,8 @@
 from django.urls import path
 from . import views
 from .views_upload import api_get_presigned_url
+from . import views_exports
+from . import views_reports
 
 app_name = "dashboard"
 
@@ -16,13 +18,24 @@ urlpatterns = [
     path("api/invoice/<int:pk>/update/", views.api_invoice_update, name="api-invoice-update"),
     path("api/invoice/<int:pk>/delete/", views.api_invoice_delete, name="api-invoice-delete"),
     path("api/invoice/<int:pk>/status/", views.api_invoice_status, name="api-invoice-status"),
+    path("api/invoice/import/", views.api_invoice_import, name="api-invoice-import"),
+    path("api/invoices/batch/status/", views.api_invoices_batch_status, name="api-invoices-batch-status"),
+    path("api/invoices/batch/update/", views.api_invoices_batch_update, name="api-invoices-batch-update"),
+    path("api/invoices/batch/delete/", views.api_invoices_batch_delete, name="api-invoices-batch-delete"),
     path("api/filters/", views.api_filters, name="api-filters"),
+    path("api/totals/", views.api_totals, name="api-totals"),
+    path("api/pivot/", views_reports.api_pivot, name="api-pivot"),
 
     path('api/get-upload-url/', api_get_presigned_url, name='api-get-upload-url'),
     
     # Export to Excel
     path("api/export/excel/", views.api_export_excel, name="api-export-excel"),
 
+    # background export jobs (processed by `manage.py run_export_jobs`)
+    path("api/export/jobs/", views_exports.api_export_job_create, name="api-export-job-create"),
+    path("api/export/jobs/<int:pk>/", views_exports.api_export_job_status, name="api-export-job-status"),
+    path("api/export/jobs/<int:pk>/download/", views_exports.api_export_job_download, name="api-export-job-download"),
+
     # remarks
     path("api/remarks/", views.api_remarks_list, name="api-remarks-list"),
     path("api/remarks/add/", views.api_remarks_add, name="api-remarks-add"),
@@ -1,44 +1,35 @@
+import hashlib
+import json
+import logging
 from datetime import datetime
 from decimal import Decimal
-import io
 
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, FileResponse, Http404, HttpResponse
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.http import require_http_methods
-from django.db.models import Max, Q, Value, Count, Sum, F
-from django.db.models.functions import Lower, TruncMonth
-from django.core.cache import cache
+from django.db.models import Max, Q, Value, Count, Sum, F, Exists, OuterRef
+from django.db.models import CharField
+from django.db.models.functions import Cast, Lower, TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
 
-from .models import Invoice, InvoiceRemarkCategory, STATUS_CHOICES, CURRENCY_CHOICES
+from .models import Invoice, InvoiceRemarkCategory, InvoiceRollup, Party, Product, STATUS_CHOICES, CURRENCY_CHOICES
+from . import batch, imports
+from .rates import get_rate_table
+from .caching import INVOICES, bump_data_version, get_or_compute
+from .conditional import conditional_on
+from .search import search_q
+from .pagination import InvalidCursor, decode_cursor, keyset_iterator, keyset_page
+
+logger = logging.getLogger(__name__)
 
 # >>> ADD: logging util & enums
-from log.utils import log_action
+from log.utils import log_action, log_actions
 from log.models import LogEntry
 
-# Import for Excel export
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    EXCEL_AVAILABLE = True
-except ImportError:
-    EXCEL_AVAILABLE = False
-
-
-# Currency conversion rates (base: IDR)
-CURRENCY_RATES = {
-    'IDR': 1.0,
-    'USD': 15800.0,  # 1 USD = 15800 IDR
-    'SGD': 11700.0,  # 1 SGD = 11700 IDR
-}
-
-def convert_currency(amount, from_currency, to_currency):
-    """Convert amount from one currency to another"""
-    if from_currency == to_currency:
-        return amount
-    # Convert to IDR first, then to target currency
-    amount_in_idr = amount * CURRENCY_RATES.get(from_currency, 1.0)
-    return amount_in_idr / CURRENCY_RATES.get(to_currency, 1.0)
+# Exports (openpyxl is optional, csv / ndjson.gz need nothing extra)
+from .exports import EXCEL_AVAILABLE, EXPORT_FORMATS, export_response
 
 
 # ---------- helpers ----------
@@ -55,28 +46,97 @@ def _parse_range_str(s: str):
     except Exception:
         return (None, None)
 
+# above this many invoices matched through product / party / remark names,
+# check each row's references with EXISTS on the (search-indexed) name
+# tables instead of id lists, so an ordered scan can stop once it has a page
+INVOICE_SEARCH_DENSE = 20000
+
+def _invoice_search_q(q):
+    """
+    ?q= matches a substring of the invoice number, product, either party or
+    the remark name. Invoice numbers and the product / party names go
+    through the search index (search.py); the name tables are small, and
+    their reference counts also tell how many invoices the names match.
+    """
+    product_names = Product.objects.filter(search_q(Product, q))
+    party_names = Party.objects.filter(search_q(Party, q))
+    products = list(product_names.filter(invoice_count__gt=0).values_list("id", "invoice_count"))
+    parties = list(party_names.values_list("id", "sent_count", "received_count"))
+    remark_ids = list(InvoiceRemarkCategory.objects.filter(name__icontains=q).values_list("id", flat=True))
+    matched = sum(n for _, n in products) + sum(sent + received for _, sent, received in parties)
+    if remark_ids:
+        matched += InvoiceRollup.objects.filter(remark__in=remark_ids).aggregate(n=Sum("invoice_count"))["n"] or 0
+
+    if matched > INVOICE_SEARCH_DENSE:
+        names = (
+            Exists(product_names.filter(pk=OuterRef("product_ref")))
+            | Exists(party_names.filter(pk=OuterRef("from_party_ref")))
+            | Exists(party_names.filter(pk=OuterRef("to_party_ref")))
+            | Q(remark__in=remark_ids)
+        )
+    else:
+        names = (
+            Q(product_ref__in=[pk for pk, _ in products])
+            | Q(from_party_ref__in=[pk for pk, sent, _ in parties if sent])
+            | Q(to_party_ref__in=[pk for pk, _, received in parties if received])
+            | Q(remark__in=remark_ids)
+        )
+    return search_q(Invoice, q) | names
+
+def _filter_invoices(params, qs=None):
+    """Apply the table filters (q, product, remark, currency, status, from, to, daterange)."""
+    if qs is None:
+        qs = Invoice.objects.all()
+
+    product = params.get("product") or ""
+    remark_id = params.get("remark_id") or ""
+    currency = params.get("currency") or ""
+    status = params.get("status") or ""
+    from_p = params.get("from") or ""
+    to_p = params.get("to") or ""
+    dr = params.get("daterange") or ""
+    q = (params.get("q") or "").strip()
+    start, end = _parse_range_str(dr)
+
+    if q:
+        qs = qs.filter(_invoice_search_q(q))
+
+    # names are matched through the dimension tables, so the invoice table
+    # is filtered on integer keys: ref_id IN (SELECT id ... WHERE name = %s)
+    if product and product != "ALL":
+        qs = qs.filter(product_ref__in=Product.objects.filter(name=product).values("id"))
+    if remark_id and remark_id != "ALL" and remark_id.isdigit():
+        qs = qs.filter(remark_id=int(remark_id))
+    if currency and currency != "ALL":
+        qs = qs.filter(currency=currency)
+    if status and status != "ALL":
+        qs = qs.filter(status=status)
+    if from_p and from_p != "ALL":
+        qs = qs.filter(from_party_ref__in=Party.objects.filter(name=from_p).values("id"))
+    if to_p and to_p != "ALL":
+        qs = qs.filter(to_party_ref__in=Party.objects.filter(name=to_p).values("id"))
+    if start and end:
+        qs = qs.filter(date__range=(start, end))
+    return qs
+
 # ============================================================================
-# OPTIMIZED: Reduced from ~10 queries to 1 query
+# OPTIMIZED: filter lists read from the dimension tables
 # ============================================================================
-def _filters_payload():
+def _build_filters_payload():
     """
-    BEFORE: ~10 separate distinct queries
-    AFTER: 1 query with values_list
-    IMPROVEMENT: 90% faster
+    BEFORE: DISTINCT scans of the invoice table
+    AFTER: reads of the Product / Party dimension tables
+    IMPROVEMENT: cost follows the number of names, not the number of invoices
     """
-    cache_key = 'filters_payload_v2'
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-    
-    # Use values() to get only what we need - much faster
-    qs = Invoice.objects.all()
-    
-    products = list(qs.order_by(Lower("product")).values_list("product", flat=True).distinct())
+    # only names some invoice still uses
+    products = list(
+        Product.objects.filter(invoice_count__gt=0).order_by(Lower("name")).values_list("name", flat=True)
+    )
     currencies = [c for c, _ in CURRENCY_CHOICES]
     statuses = [s for s, _ in STATUS_CHOICES]
-    senders = list(qs.order_by(Lower("from_party")).values_list("from_party", flat=True).distinct())
-    receivers = list(qs.order_by(Lower("to_party")).values_list("to_party", flat=True).distinct())
+    parties = Party.objects.order_by(Lower("name"))
+    senders = list(parties.filter(sent_count__gt=0).values_list("name", flat=True))
+    receivers = list(parties.filter(received_count__gt=0).values_list("name", flat=True))
     
     # Optimized remark query
     remarks = list(
@@ -92,11 +152,77 @@ def _filters_payload():
         "receivers": receivers,
         "remarks": remarks,
     }
-    
-    # Cache for 10 minutes
-    cache.set(cache_key, result, 600)
     return result
 
+def _filters_payload():
+    # Fresh for 10 minutes, then served stale while one request rebuilds it
+    return get_or_compute('filters_payload', _build_filters_payload, 3600, soft_ttl=600)
+
+# ---------- facets ----------
+# facet name -> Invoice column whose values are counted
+FACET_FIELDS = {
+    "product": "product",
+    "remark": "remark_id",
+    "currency": "currency",
+    "status": "status",
+    "from": "from_party",
+    "to": "to_party",
+}
+INVOICE_FILTER_PARAMS = ("q", "product", "remark_id", "currency", "status", "from", "to", "daterange")
+
+def _filter_signature(params):
+    """Short stable hash of the invoice filters in `params`, for cache keys ("all" when unfiltered)."""
+    items = sorted(
+        (k, params.get(k)) for k in INVOICE_FILTER_PARAMS
+        if params.get(k) and params.get(k) != "ALL"
+    )
+    if not items:
+        return "all"
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()[:20]
+
+def _facets_unfiltered():
+    """Counts of the whole table from the dimension ref counts and the rollup."""
+    facets = {name: {} for name in FACET_FIELDS}
+    facets["product"] = dict(Product.objects.filter(invoice_count__gt=0).values_list("name", "invoice_count"))
+    for name, sent, received in Party.objects.values_list("name", "sent_count", "received_count"):
+        if sent:
+            facets["from"][name] = sent
+        if received:
+            facets["to"][name] = received
+    groups = (
+        InvoiceRollup.objects.values("remark_id", "currency", "status")
+        .annotate(n=Sum("invoice_count"))
+        .order_by()
+    )
+    for g in groups:
+        for facet, key in (("remark", g["remark_id"]), ("currency", g["currency"]), ("status", g["status"])):
+            key = "-" if key is None else str(key)
+            facets[facet][key] = facets[facet].get(key, 0) + g["n"]
+    return facets
+
+def _build_facets(params):
+    """
+    {facet: {value: invoice count}} for the invoices matching `params`.
+    One statement: a UNION ALL of one GROUP BY per facet over the filtered set.
+    """
+    if _filter_signature(params) == "all":
+        return _facets_unfiltered()
+    qs = _filter_invoices(params).order_by()
+    parts = [
+        qs.annotate(facet=Value(name), value=Cast(field, CharField()))
+        .values("facet", "value")
+        .annotate(n=Count("id"))
+        .values_list("facet", "value", "n")
+        for name, field in FACET_FIELDS.items()
+    ]
+    facets = {name: {} for name in FACET_FIELDS}
+    for facet, value, n in parts[0].union(*parts[1:], all=True):
+        facets[facet]["-" if value is None else value] = n
+    return facets
+
+def _facets(params):
+    return get_or_compute("facets", lambda: _build_facets(params), 600, _filter_signature(params))
+
 # ---------- pages ----------
 @login_required
 def home(request):
@@ -118,163 +244,298 @@ def settings_page(request):
 
 # ---------- API: filters ----------
 @login_required
+@conditional_on(INVOICES)
 def api_filters(request):
-    return JsonResponse(_filters_payload())
+    """
+    The filter value lists. With ?facets=1, also the number of invoices per
+    value of each facet under the filters given in the query string
+    (same parameters as api_invoices).
+    """
+    payload = _filters_payload()
+    if request.GET.get("facets") in ("1", "true"):
+        payload = dict(payload, facets=_facets(request.GET))
+    return JsonResponse(payload)
+
+# ---------- API: invoices ----------
+# columns needed to render one table row, fetched with values() (no model instances)
+INVOICE_ROW_FIELDS = (
+    "id", "product", "date", "remark__name", "invoice_number", "amount",
+    "currency", "status", "from_party", "to_party", "file",
+)
+
+def _invoice_row(row):
+    return {
+        "id": row["id"],
+        "product": row["product"],
+        "date": row["date"].strftime("%Y-%m-%d"),
+        "remark": row["remark__name"] or "-",
+        "invoice_number": row["invoice_number"],
+        "amount": f"{row['amount']:.2f}",
+        "currency": row["currency"],
+        "status": row["status"],
+        "from_party": row["from_party"],
+        "to_party": row["to_party"],
+        # imported invoices have no file
+        "download_url": f"/dashboard/download/{row['id']}/" if row["file"] else None,
+    }
+
+
+# public sort name -> model field; every ordering is made unique with id,
+# and each (field, id) pair has a composite index (see Invoice.Meta)
+INVOICE_SORT_FIELDS = {
+    "date": "date",
+    "amount": "amount",
+    "invoice_number": "invoice_number",
+    "product": "product",
+    "status": "status",
+    "currency": "currency",
+    "from": "from_party",
+    "to": "to_party",
+    "uploaded_at": "uploaded_at",
+}
+INVOICE_DEFAULT_SORT = "-date"
+INVOICE_PAGE_LIMIT = 50
+INVOICE_PAGE_MAX_LIMIT = 500
+
+def _invoice_ordering(sort: str):
+    desc = sort.startswith("-")
+    field = INVOICE_SORT_FIELDS.get(sort.lstrip("-"))
+    if field is None:
+        return None
+    prefix = "-" if desc else ""
+    return (f"{prefix}{field}", f"{prefix}id")
+
+def _invoice_cursor_value(field, raw):
+    # every sort field is NOT NULL, so a cursor never holds null or a container
+    if raw is None or isinstance(raw, (bool, list, dict)):
+        raise InvalidCursor("Malformed cursor")
+    value = Invoice._meta.get_field(field).to_python(raw)
+    if value is None:
+        raise InvalidCursor("Malformed cursor")
+    return value
+
+def _api_invoices_page(request, qs, sort, ordering):
+    """Keyset-paginated variant of api_invoices (?limit=&cursor=&sort=)."""
+    try:
+        limit = int(request.GET.get("limit") or INVOICE_PAGE_LIMIT)
+    except ValueError:
+        return JsonResponse({"ok": False, "msg": "Invalid limit"}, status=400)
+    limit = max(1, min(limit, INVOICE_PAGE_MAX_LIMIT))
+
+    token = request.GET.get("cursor") or ""
+    try:
+        cursor = decode_cursor(token) if token else None
+        rows, next_cursor, prev_cursor = keyset_page(
+            qs.values(*INVOICE_ROW_FIELDS, "uploaded_at"),
+            ordering,
+            limit,
+            cursor=cursor,
+            key_fn=_invoice_cursor_value,
+            tag=sort,
+        )
+    except InvalidCursor as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+
+    return JsonResponse({
+        "items": [_invoice_row(r) for r in rows],
+        "next": next_cursor,
+        "prev": prev_cursor,
+        "limit": limit,
+        "sort": sort,
+    })
+
+INVOICE_STREAM_CHUNK = 2000
+
+def _api_invoices_stream(request, qs, ordering):
+    """
+    Streaming variant of api_invoices (?stream=1[&format=json|ndjson]).
+
+    Rows are read in keyset chunks from a values() projection and written
+    out as they arrive, so memory stays flat and the first byte goes out
+    after the first chunk regardless of table size.
+    """
+    fmt = (request.GET.get("format") or "json").lower()
+    if fmt not in ("json", "ndjson"):
+        return JsonResponse({"ok": False, "msg": "Invalid format. Use json or ndjson."}, status=400)
+
+    rows = keyset_iterator(
+        qs.values(*INVOICE_ROW_FIELDS, "uploaded_at"), ordering, chunk_size=INVOICE_STREAM_CHUNK
+    )
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def ndjson():
+        buf = []
+        for row in rows:
+            buf.append(encoder.encode(_invoice_row(row)))
+            if len(buf) >= INVOICE_STREAM_CHUNK:
+                yield "\n".join(buf) + "\n"
+                buf = []
+        if buf:
+            yield "\n".join(buf) + "\n"
+
+    def json_array():
+        # same {"items": [...]} shape as the buffered response
+        yield '{"items":['
+        sep = ""
+        buf = []
+        for row in rows:
+            buf.append(sep + encoder.encode(_invoice_row(row)))
+            sep = ","
+            if len(buf) >= INVOICE_STREAM_CHUNK:
+                yield "".join(buf)
+                buf = []
+        yield "".join(buf) + "]}"
+
+    if fmt == "ndjson":
+        resp = StreamingHttpResponse(ndjson(), content_type="application/x-ndjson")
+    else:
+        resp = StreamingHttpResponse(json_array(), content_type="application/json")
+    resp["X-Accel-Buffering"] = "no"
+    return resp
 
-# ============================================================================
-# OPTIMIZED: Reduced from N+1 queries to 1 query
-# ============================================================================
 @login_required
+@conditional_on(INVOICES)
 def api_invoices(request):
     """
-    BEFORE: N+1 query problem - accessing inv.remark.name in loop
-    AFTER: Use select_related to load remark in ONE query
-    IMPROVEMENT: From 100+ queries to 1 query (99% reduction!)
+    Without paging params the full filtered list is returned (used by the
+    dashboard table). Passing ?limit= and/or ?cursor= switches to keyset
+    pagination: each page is one index range scan on (sort column, id),
+    so page N costs the same as page 1. ?stream=1 streams the whole
+    filtered set as JSON or NDJSON.
     """
-    # START with optimized queryset
-    qs = Invoice.objects.select_related('remark')  # <<< KEY OPTIMIZATION
-    
-    # Apply filters
-    product = request.GET.get("product") or ""
-    remark_id = request.GET.get("remark_id") or ""
-    currency = request.GET.get("currency") or ""
-    status = request.GET.get("status") or ""
-    from_p = request.GET.get("from") or ""
-    to_p = request.GET.get("to") or ""
-    dr = request.GET.get("daterange") or ""
-    start, end = _parse_range_str(dr)
+    qs = _filter_invoices(request.GET)
 
-    if product and product != "ALL":
-        qs = qs.filter(product=product)
-    if remark_id and remark_id != "ALL" and remark_id.isdigit():
-        qs = qs.filter(remark_id=int(remark_id))
-    if currency and currency != "ALL":
-        qs = qs.filter(currency=currency)
-    if status and status != "ALL":
-        qs = qs.filter(status=status)
-    if from_p and from_p != "ALL":
-        qs = qs.filter(from_party=from_p)
-    if to_p and to_p != "ALL":
-        qs = qs.filter(to_party=to_p)
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
+    sort = request.GET.get("sort") or INVOICE_DEFAULT_SORT
+    ordering = _invoice_ordering(sort)
+    if ordering is None:
+        return JsonResponse({
+            "ok": False,
+            "msg": f"Invalid sort. Use one of: {', '.join(sorted(INVOICE_SORT_FIELDS))} (prefix '-' for descending).",
+        }, status=400)
+
+    if request.GET.get("stream") in ("1", "true"):
+        return _api_invoices_stream(request, qs, ordering)
+    if "limit" in request.GET or "cursor" in request.GET:
+        return _api_invoices_page(request, qs, sort, ordering)
 
     # Order for consistent results
-    qs = qs.order_by('-date', '-id')
-    
-    # Build response - remark already loaded, no extra queries!
-    data = []
-    for inv in qs:
-        data.append({
-            "id": inv.id,
-            "product": inv.product,
-            "date": inv.date.strftime("%Y-%m-%d"),
-            "remark": inv.remark.name if inv.remark else "-",  # No extra query!
-            "invoice_number": inv.invoice_number,
-            "amount": f"{inv.amount:.2f}",
-            "currency": inv.currency,
-            "status": inv.status,
-            "from_party": inv.from_party,
-            "to_party": inv.to_party,
-            "download_url": f"/dashboard/download/{inv.pk}/",
-        })
-    return JsonResponse({"items": data})
+    qs = qs.order_by(*ordering).values(*INVOICE_ROW_FIELDS)
+    return JsonResponse({"items": [_invoice_row(r) for r in qs]})
+
+# ---------- API: totals ----------
+def _totals_groups(params):
+    """(currency, status, month) groups with count and sums, from the rollup when unfiltered."""
+    if _filter_signature(params) == "all":
+        return list(
+            InvoiceRollup.objects.values("currency", "status", "month")
+            .annotate(n=Sum("invoice_count"), amount=Sum("amount_sum"), amount_idr=Sum("amount_idr_sum"))
+            .order_by()
+        )
+    return list(
+        _filter_invoices(params)
+        .annotate(month=TruncMonth("date"))
+        .values("currency", "status", "month")
+        .annotate(n=Count("id"), amount=Sum("amount"), amount_idr=Sum("amount_idr"))
+        .order_by()
+    )
+
+def _build_totals(params, target_currency):
+    """
+    Counts and sums per currency and per status, and a grand total in
+    target_currency. Amounts already in target_currency are taken as they
+    are; the others are converted from their IDR value at each month's rate.
+    """
+    groups = _totals_groups(params)
+    converted = get_rate_table().convert_many(
+        ((g["amount_idr"], "IDR", g["month"]) for g in groups), target_currency
+    )
+    by_currency, by_status = {}, {}
+    grand_total = Decimal(0)
+    for g, in_target in zip(groups, converted):
+        if g["currency"] == target_currency:
+            in_target = Decimal(g["amount"] or 0)
+        cur = by_currency.setdefault(g["currency"], {"count": 0, "amount": Decimal(0), "amount_idr": Decimal(0)})
+        cur["count"] += g["n"]
+        cur["amount"] += Decimal(g["amount"] or 0)
+        cur["amount_idr"] += Decimal(g["amount_idr"] or 0)
+        st = by_status.setdefault(g["status"], {"count": 0, "amount": Decimal(0)})
+        st["count"] += g["n"]
+        st["amount"] += in_target
+        grand_total += in_target
+
+    def fmt(d):
+        return {k: (f"{v:.2f}" if isinstance(v, Decimal) else v) for k, v in d.items()}
+
+    return {
+        "currency": target_currency,
+        "count": sum(c["count"] for c in by_currency.values()),
+        "by_currency": {k: fmt(v) for k, v in sorted(by_currency.items())},
+        "by_status": {k: fmt(v) for k, v in sorted(by_status.items())},
+        "grand_total": f"{grand_total:.2f}",
+    }
+
+@login_required
+@conditional_on(INVOICES)
+def api_totals(request):
+    """
+    Totals of the invoices matching the api_invoices filters: per currency
+    (native amount and IDR), per status and overall in ?convert_to= (default
+    IDR; ?currency= stays the currency filter).
+    """
+    target_currency = request.GET.get("convert_to") or "IDR"
+    if target_currency not in CHART_CURRENCIES:
+        return JsonResponse({"ok": False, "msg": f"Invalid convert_to. Use one of: {', '.join(CHART_CURRENCIES)}"}, status=400)
+    result = get_or_compute(
+        "totals", lambda: _build_totals(request.GET, target_currency), 600,
+        _filter_signature(request.GET), target_currency,
+    )
+    return JsonResponse(result)
 
 # ============================================================================
-# OPTIMIZED: Export with select_related
+# Export: rows read in keyset chunks; xlsx via a write-only workbook,
+# csv / ndjson.gz streamed straight to the client
 # ============================================================================
+INVOICE_EXPORT_HEADERS = ["Product", "Date", "Invoice Remarks", "Invoice Number", "Amount", "Currency", "Status", "From", "To"]
+INVOICE_EXPORT_KEYS = ["product", "date", "remark", "invoice_number", "amount", "currency", "status", "from_party", "to_party"]
+
+def _invoice_export_rows(qs):
+    """Yield export rows (Product to To) from a slim values() projection."""
+    rows = keyset_iterator(qs.values(*INVOICE_ROW_FIELDS), ("-date", "-id"), chunk_size=INVOICE_STREAM_CHUNK)
+    for r in rows:
+        yield (
+            r["product"],
+            r["date"].strftime("%Y-%m-%d"),
+            r["remark__name"] or "-",
+            r["invoice_number"],
+            r["amount"],
+            r["currency"],
+            r["status"],
+            r["from_party"],
+            r["to_party"],
+        )
+
 @login_required
 def api_export_excel(request):
     """
-    BEFORE: N+1 query accessing inv.remark.name
-    AFTER: Use select_related
+    ?format=xlsx (default), csv or ndjson.gz. Rows are read in keyset
+    chunks, so memory use does not grow with the number of exported
+    invoices; csv and ndjson.gz start streaming after the first chunk.
     """
-    if not EXCEL_AVAILABLE:
+    fmt = (request.GET.get("format") or "xlsx").lower()
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+    if fmt == "xlsx" and not EXCEL_AVAILABLE:
         return JsonResponse({"error": "openpyxl not installed"}, status=500)
-    
-    # Get filtered queryset with optimization
-    qs = Invoice.objects.select_related('remark')  # <<< KEY OPTIMIZATION
-    
-    product = request.GET.get("product") or ""
-    remark_id = request.GET.get("remark_id") or ""
-    currency = request.GET.get("currency") or ""
-    status = request.GET.get("status") or ""
-    from_p = request.GET.get("from") or ""
-    to_p = request.GET.get("to") or ""
-    dr = request.GET.get("daterange") or ""
-    start, end = _parse_range_str(dr)
 
-    if product and product != "ALL":
-        qs = qs.filter(product=product)
-    if remark_id and remark_id != "ALL" and remark_id.isdigit():
-        qs = qs.filter(remark_id=int(remark_id))
-    if currency and currency != "ALL":
-        qs = qs.filter(currency=currency)
-    if status and status != "ALL":
-        qs = qs.filter(status=status)
-    if from_p and from_p != "ALL":
-        qs = qs.filter(from_party=from_p)
-    if to_p and to_p != "ALL":
-        qs = qs.filter(to_party=to_p)
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
-
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Invoice Summary"
-    
-    # Header style
-    header_fill = PatternFill(start_color="102B86", end_color="102B86", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Headers (Product to To, exclude Action and Download)
-    headers = ["Product", "Date", "Invoice Remarks", "Invoice Number", "Amount", "Currency", "Status", "From", "To"]
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-    
-    # Data rows - remark already loaded!
-    for row_num, inv in enumerate(qs, 2):
-        ws.cell(row=row_num, column=1, value=inv.product)
-        ws.cell(row=row_num, column=2, value=inv.date.strftime("%Y-%m-%d"))
-        ws.cell(row=row_num, column=3, value=inv.remark.name if inv.remark else "-")  # No extra query!
-        ws.cell(row=row_num, column=4, value=inv.invoice_number)
-        ws.cell(row=row_num, column=5, value=float(inv.amount))
-        ws.cell(row=row_num, column=6, value=inv.currency)
-        ws.cell(row=row_num, column=7, value=inv.status)
-        ws.cell(row=row_num, column=8, value=inv.from_party)
-        ws.cell(row=row_num, column=9, value=inv.to_party)
-    
-    # Auto-adjust column widths
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column].width = adjusted_width
-    
-    # Save to BytesIO
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    qs = _filter_invoices(request.GET)
+    return export_response(
+        fmt,
+        "InvoiceSummaryFile",
+        "Invoice Summary",
+        INVOICE_EXPORT_HEADERS,
+        INVOICE_EXPORT_KEYS,
+        _invoice_export_rows(qs),
     )
-    response['Content-Disposition'] = 'attachment; filename="InvoiceSummaryFile.xlsx"'
-    
-    return response
 
 # ---------- API: create/update/delete/status (with logging) ----------
 @login_required
@@ -315,41 +576,39 @@ def api_invoice_create(request):
             "msg": f"File too large ({traditional_file.size / (1024*1024):.1f}MB). Please use a file smaller than 4.5MB or the system will upload automatically to R2."
         }, status=400)
     
-    # Create invoice
-    if file_key:
-        # Large file - already uploaded to R2, just save the key
-        inv = Invoice.objects.create(
-            product=product,
-            date=date,
-            remark=remark,
-            invoice_number=invoice_number,
-            amount=amount,
-            currency=currency,
-            status=status,
-            from_party=from_party,
-            to_party=to_party,
-            file=file_key  # Save R2 key path
-        )
-    else:
-        # Small file - traditional Vercel upload
-        inv = Invoice.objects.create(
-            product=product,
-            date=date,
-            remark=remark,
-            invoice_number=invoice_number,
-            amount=amount,
-            currency=currency,
-            status=status,
-            from_party=from_party,
-            to_party=to_party,
-            file=traditional_file
-        )
+    # Create invoice (save() applies the rollup delta in the same transaction)
+    with transaction.atomic():
+        if file_key:
+            # Large file - already uploaded to R2, just save the key
+            inv = Invoice.objects.create(
+                product=product,
+                date=date,
+                remark=remark,
+                invoice_number=invoice_number,
+                amount=amount,
+                currency=currency,
+                status=status,
+                from_party=from_party,
+                to_party=to_party,
+                file=file_key  # Save R2 key path
+            )
+        else:
+            # Small file - traditional Vercel upload
+            inv = Invoice.objects.create(
+                product=product,
+                date=date,
+                remark=remark,
+                invoice_number=invoice_number,
+                amount=amount,
+                currency=currency,
+                status=status,
+                from_party=from_party,
+                to_party=to_party,
+                file=traditional_file
+            )
 
-    # Invalidate caches
-    cache.delete('filters_payload_v2')
-    cache.delete('chart_data_IDR')
-    cache.delete('chart_data_USD')
-    cache.delete('chart_data_SGD')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # Log action
     log_action(
@@ -366,59 +625,59 @@ def api_invoice_create(request):
 @login_required
 @require_http_methods(["POST"])
 def api_invoice_update(request, pk):
-    inv = get_object_or_404(Invoice, pk=pk)
+    # lock the row and snapshot it inside the transaction, so concurrent
+    # edits cannot both start from the same rollup / dimension state
+    with transaction.atomic():
+        inv = get_object_or_404(Invoice.objects.select_for_update(), pk=pk)
 
-    product = request.POST.get("product", inv.product).strip()
-    date_str = request.POST.get("date", inv.date.strftime("%Y-%m-%d")).strip()
-    remark_id = request.POST.get("remark_id", str(inv.remark_id or "0")).strip()
-    invoice_number = request.POST.get("invoice_number", inv.invoice_number).strip()
-    amount_str = (request.POST.get("amount", str(inv.amount)) or "0").replace(",", ".")
-    currency = request.POST.get("currency", inv.currency)
-    status = request.POST.get("status", inv.status)
-    from_party = request.POST.get("from_party", inv.from_party).strip()
-    to_party = request.POST.get("to_party", inv.to_party).strip()
+        product = request.POST.get("product", inv.product).strip()
+        date_str = request.POST.get("date", inv.date.strftime("%Y-%m-%d")).strip()
+        remark_id = request.POST.get("remark_id", str(inv.remark_id or "0")).strip()
+        invoice_number = request.POST.get("invoice_number", inv.invoice_number).strip()
+        amount_str = (request.POST.get("amount", str(inv.amount)) or "0").replace(",", ".")
+        currency = request.POST.get("currency", inv.currency)
+        status = request.POST.get("status", inv.status)
+        from_party = request.POST.get("from_party", inv.from_party).strip()
+        to_party = request.POST.get("to_party", inv.to_party).strip()
 
-    if not remark_id or remark_id == "-" or remark_id == "0":
-        return JsonResponse({"ok": False, "msg": "Please choose invoice remark."}, status=400)
+        if not remark_id or remark_id == "-" or remark_id == "0":
+            return JsonResponse({"ok": False, "msg": "Please choose invoice remark."}, status=400)
 
-    old_status = inv.status
-    old_amount = inv.amount
-    old_currency = inv.currency
-
-    inv.product = product
-    inv.date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    inv.remark = get_object_or_404(InvoiceRemarkCategory, pk=int(remark_id))
-    inv.invoice_number = invoice_number
-    inv.amount = Decimal(amount_str)
-    inv.currency = currency
-    inv.status = status
-    inv.from_party = from_party
-    inv.to_party = to_party
-
-    file_key = request.POST.get("file_key")
-    traditional_file = request.FILES.get("file")
-    
-    if file_key:
-        # Large file uploaded to R2
-        inv.file = file_key
-    elif traditional_file:
-        # Small file traditional upload
-        # Validate size
-        if traditional_file.size > 4.5 * 1024 * 1024:
-            return JsonResponse({
-                "ok": False,
-                "msg": f"File too large ({traditional_file.size / (1024*1024):.1f}MB)."
-            }, status=400)
-        inv.file = traditional_file
-    # else: No file update, keep existing file
+        old_status = inv.status
+        old_amount = inv.amount
+        old_currency = inv.currency
+
+        inv.product = product
+        inv.date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        inv.remark = get_object_or_404(InvoiceRemarkCategory, pk=int(remark_id))
+        inv.invoice_number = invoice_number
+        inv.amount = Decimal(amount_str)
+        inv.currency = currency
+        inv.status = status
+        inv.from_party = from_party
+        inv.to_party = to_party
+
+        file_key = request.POST.get("file_key")
+        traditional_file = request.FILES.get("file")
     
-    inv.save()
+        if file_key:
+            # Large file uploaded to R2
+            inv.file = file_key
+        elif traditional_file:
+            # Small file traditional upload
+            # Validate size
+            if traditional_file.size > 4.5 * 1024 * 1024:
+                return JsonResponse({
+                    "ok": False,
+                    "msg": f"File too large ({traditional_file.size / (1024*1024):.1f}MB)."
+                }, status=400)
+            inv.file = traditional_file
+        # else: No file update, keep existing file
+
+        inv.save()
 
-    # Invalidate caches
-    cache.delete('filters_payload_v2')
-    cache.delete('chart_data_IDR')
-    cache.delete('chart_data_USD')
-    cache.delete('chart_data_SGD')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # Log update
     detail_parts = []
@@ -441,17 +700,15 @@ def api_invoice_update(request, pk):
 @login_required
 @require_http_methods(["POST"])
 def api_invoice_delete(request, pk):
-    inv = get_object_or_404(Invoice, pk=pk)
-    inv_number = inv.invoice_number
-    inv_currency = inv.currency
-    inv_amount = inv.amount
-    inv.delete()
+    with transaction.atomic():
+        inv = get_object_or_404(Invoice.objects.select_for_update(), pk=pk)
+        inv_number = inv.invoice_number
+        inv_currency = inv.currency
+        inv_amount = inv.amount
+        inv.delete()
 
-    # Invalidate caches
-    cache.delete('filters_payload_v2')
-    cache.delete('chart_data_IDR')
-    cache.delete('chart_data_USD')
-    cache.delete('chart_data_SGD')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # >>> LOG: delete
     log_action(
@@ -467,19 +724,18 @@ def api_invoice_delete(request, pk):
 @login_required
 @require_http_methods(["POST"])
 def api_invoice_status(request, pk):
-    inv = get_object_or_404(Invoice, pk=pk)
     new_status = request.POST.get("status")
     legal = [s for s, _ in STATUS_CHOICES]
     if new_status not in legal:
         return JsonResponse({"ok": False, "msg": "Invalid status"}, status=400)
-    old_status = inv.status
-    inv.status = new_status
-    inv.save()
+    with transaction.atomic():
+        inv = get_object_or_404(Invoice.objects.select_for_update(), pk=pk)
+        old_status = inv.status
+        inv.status = new_status
+        inv.save()
 
-    # Invalidate chart cache
-    cache.delete('chart_data_IDR')
-    cache.delete('chart_data_USD')
-    cache.delete('chart_data_SGD')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # >>> LOG: change status
     log_action(
@@ -492,6 +748,180 @@ def api_invoice_status(request, pk):
     )
     return JsonResponse({"ok": True})
 
+@login_required
+@require_http_methods(["POST"])
+def api_invoice_import(request):
+    """
+    Import invoices from an uploaded CSV / XLSX (`file`, columns as in the
+    export). All rows are validated first; nothing is written unless every
+    row is valid. `dry_run=1` only validates.
+    """
+    upload = request.FILES.get("file")
+    if not upload:
+        return JsonResponse({"ok": False, "msg": "File is required."}, status=400)
+    fmt = upload.name.rsplit(".", 1)[-1].lower()
+    if fmt not in imports.IMPORT_FORMATS:
+        return JsonResponse({"ok": False, "msg": "Upload a .csv or .xlsx file."}, status=400)
+    dry_run = request.POST.get("dry_run") in ("1", "true", "on")
+
+    try:
+        rows, errors = imports.parse_file(upload, fmt)
+    except imports.ImportFileError as e:
+        return JsonResponse({"ok": False, "msg": f"Can't read the file: {e}"}, status=400)
+
+    valid = len(rows)
+    if errors:
+        return JsonResponse({"ok": False, "msg": f"{len(errors)} row(s) have errors; nothing was imported.",
+                             "valid": valid, "errors": errors}, status=400)
+    if dry_run or not rows:
+        return JsonResponse({"ok": True, "dry_run": dry_run, "valid": valid, "created": 0, "errors": []})
+
+    # database errors are not the file's fault: let them through
+    created = imports.import_rows(rows)
+
+    # Invalidate caches once for the whole batch
+    bump_data_version()
+
+    log_action(
+        request.user,
+        action=LogEntry.Action.IMPORT_INVOICES,
+        entity_type=LogEntry.Entity.INVOICE,
+        entity_label=upload.name[:255],
+        details=f"Import {created} invoice(s) from {upload.name}"
+    )
+    return JsonResponse({"ok": True, "dry_run": False, "valid": valid, "created": created, "errors": []})
+
+# ---------- API: batch changes ----------
+def _batch_targets(request):
+    """
+    The invoices a batch request targets: `ids` (repeated or comma-separated)
+    or the api_invoices filters. Filters must narrow the table unless `all=1`.
+    Returns (queryset, error response); read it with batch.target_rows()
+    inside the transaction that makes the change.
+    """
+    raw_ids = [p for v in request.POST.getlist("ids") for p in v.split(",") if p.strip()]
+    if raw_ids:
+        if not all(p.strip().isdigit() for p in raw_ids):
+            return None, JsonResponse({"ok": False, "msg": "Invalid ids."}, status=400)
+        qs = Invoice.objects.filter(id__in={int(p) for p in raw_ids})
+    elif _filter_signature(request.POST) != "all" or request.POST.get("all") == "1":
+        qs = _filter_invoices(request.POST)
+    else:
+        return None, JsonResponse({"ok": False, "msg": "Give ids or at least one filter."}, status=400)
+    return qs, None
+
+@login_required
+@require_http_methods(["POST"])
+def api_invoices_batch_status(request):
+    """Set `set_status` on the targeted invoices (`status` is the filter, as in api_invoices)."""
+    new_status = request.POST.get("set_status")
+    legal = [s for s, _ in STATUS_CHOICES]
+    if new_status not in legal:
+        return JsonResponse({"ok": False, "msg": "Invalid status"}, status=400)
+    targets, error = _batch_targets(request)
+    if error:
+        return error
+
+    try:
+        with transaction.atomic():
+            rows = batch.target_rows(targets)
+            changed = batch.update_invoices(rows, {"status": new_status})
+    except batch.BatchTooLarge as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+
+    if changed:
+        # Invalidate caches once for the whole batch
+        bump_data_version()
+        log_actions(request.user, [
+            {
+                "action": LogEntry.Action.CHANGE_STATUS,
+                "entity_type": LogEntry.Entity.INVOICE,
+                "entity_id": before["id"],
+                "entity_label": before["invoice_number"],
+                "details": f"Change status {before['status']} → {new_status}",
+            }
+            for before, _ in changed
+        ])
+    return JsonResponse({"ok": True, "matched": len(rows), "updated": len(changed)})
+
+@login_required
+@require_http_methods(["POST"])
+def api_invoices_batch_update(request):
+    """Set the same status / remark / product / from / to on many invoices (`set_<field>` params)."""
+    changes = {}
+    for field in batch.BATCH_FIELDS:
+        value = request.POST.get(f"set_{field}")
+        if value is not None and value.strip():
+            changes[field] = value.strip()
+    if not changes:
+        return JsonResponse({"ok": False, "msg": "Nothing to change."}, status=400)
+    if "status" in changes and changes["status"] not in [s for s, _ in STATUS_CHOICES]:
+        return JsonResponse({"ok": False, "msg": "Invalid status"}, status=400)
+    if "remark_id" in changes:
+        if not changes["remark_id"].isdigit() or not InvoiceRemarkCategory.objects.filter(
+            pk=int(changes["remark_id"])
+        ).exists():
+            return JsonResponse({"ok": False, "msg": "Please choose invoice remark."}, status=400)
+        changes["remark_id"] = int(changes["remark_id"])
+    for field in ("product", "from_party", "to_party"):
+        if len(changes.get(field, "")) > 200:
+            return JsonResponse({"ok": False, "msg": f"{field} is too long."}, status=400)
+    targets, error = _batch_targets(request)
+    if error:
+        return error
+
+    try:
+        with transaction.atomic():
+            rows = batch.target_rows(targets)
+            changed = batch.update_invoices(rows, changes)
+    except batch.BatchTooLarge as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+
+    if changed:
+        bump_data_version()
+        log_actions(request.user, [
+            {
+                "action": LogEntry.Action.UPDATE_INVOICE,
+                "entity_type": LogEntry.Entity.INVOICE,
+                "entity_id": before["id"],
+                "entity_label": before["invoice_number"],
+                "details": "batch update: " + "; ".join(
+                    f"{field} {before[field]} → {after[field]}"
+                    for field in changes if before[field] != after[field]
+                ),
+            }
+            for before, after in changed
+        ])
+    return JsonResponse({"ok": True, "matched": len(rows), "updated": len(changed)})
+
+@login_required
+@require_http_methods(["POST"])
+def api_invoices_batch_delete(request):
+    targets, error = _batch_targets(request)
+    if error:
+        return error
+
+    try:
+        with transaction.atomic():
+            rows = batch.target_rows(targets)
+            deleted = batch.delete_invoices(rows)
+    except batch.BatchTooLarge as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+
+    if deleted:
+        bump_data_version()
+        log_actions(request.user, [
+            {
+                "action": LogEntry.Action.DELETE_INVOICE,
+                "entity_type": LogEntry.Entity.INVOICE,
+                "entity_id": row["id"],
+                "entity_label": row["invoice_number"],
+                "details": f"Delete invoice {row['invoice_number']} ({row['currency']} {row['amount']})",
+            }
+            for row in rows
+        ])
+    return JsonResponse({"ok": True, "deleted": deleted})
+
 # ---------- API: remarks ----------
 @login_required
 def api_remarks_list(request):
@@ -513,8 +943,8 @@ def api_remarks_add(request):
     max_order = InvoiceRemarkCategory.objects.aggregate(m=Max("order"))["m"] or 0
     r = InvoiceRemarkCategory.objects.create(name=name, order=max_order + 1)
 
-    # Invalidate filters cache
-    cache.delete('filters_payload_v2')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # >>> LOG: create remark
     log_action(
@@ -544,8 +974,8 @@ def api_remarks_delete(request, pk):
     
     remark.delete()
 
-    # Invalidate filters cache
-    cache.delete('filters_payload_v2')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # >>> LOG: delete remark
     log_action(
@@ -572,8 +1002,8 @@ def api_remarks_reorder(request):
         except Exception:
             continue
 
-    # Invalidate filters cache
-    cache.delete('filters_payload_v2')
+    # Invalidate caches (one version bump, applied on commit)
+    bump_data_version()
 
     # >>> LOG: reorder remark
     log_action(
@@ -588,6 +1018,8 @@ def api_remarks_reorder(request):
 @login_required
 def download_invoice(request, pk: int):
     inv = get_object_or_404(Invoice, pk=pk)
+    if not inv.file:
+        raise Http404("This invoice has no file")
     try:
         resp = FileResponse(inv.file.open("rb"), as_attachment=True, filename=inv.download_filename)
         return resp
@@ -595,93 +1027,184 @@ def download_invoice(request, pk: int):
         raise Http404("File not found")
 
 # ============================================================================
-# HEAVILY OPTIMIZED: Reduced from 100+ queries to 5 queries
+# Charts: grouped in SQL by (dimension, currency), converted in Python
 # ============================================================================
-@login_required
-def api_charts(request):
+CHART_CURRENCIES = [c for c, _ in CURRENCY_CHOICES]
+CHART_TOP_RECEIVERS = 10
+CHART_MAX_TOP = 50
+
+def _fold(groups, key, target_currency, rates):
     """
-    BEFORE: Loop through ALL invoices 4 times = 100+ queries
-    AFTER: Use Django aggregation = 5 queries total
-    IMPROVEMENT: 95% faster! From ~3s to ~0.2s
+    Sum grouped {key, bucket, currency, total, total_idr} rows into {label:
+    amount in target_currency}. Rows already in target_currency add their
+    native total; the others are converted from IDR at the bucket's rate.
+    `key` is a field name or a function of the row.
     """
-    target_currency = request.GET.get('currency', 'IDR')
-    
-    # Try cache first
-    cache_key = f'chart_data_{target_currency}'
-    cached = cache.get(cache_key)
-    if cached:
-        return JsonResponse(cached)
-    
-    # Query 1: Count by status (efficient aggregation)
-    qs_status = (
-        Invoice.objects.values("status")
-        .annotate(n=Count("id"))
-        .order_by("status")
+    converted = rates.convert_many(
+        ((g["total_idr"], "IDR", g["bucket"]) for g in groups), target_currency
     )
+    label_of = key if callable(key) else (lambda g: g[key])
+    out = {}
+    for g, amount in zip(groups, converted):
+        if g["currency"] == target_currency:
+            amount = g["total"] or 0
+        label = label_of(g)
+        out[label] = out.get(label, 0) + float(amount)
+    return out
+
+# granularity -> (Trunc function, label format)
+CHART_GRANULARITIES = {
+    "day": (TruncDay, "%Y-%m-%d"),
+    "week": (TruncWeek, "%Y-%m-%d"),  # labelled by the Monday
+    "month": (TruncMonth, "%Y-%m"),
+    "quarter": (TruncQuarter, None),
+    "year": (TruncYear, "%Y"),
+}
+CHART_DEFAULT_GRANULARITY = "month"
+
+def _period_label(d, granularity):
+    if granularity == "quarter":
+        return f"{d.year}-Q{(d.month - 1) // 3 + 1}"
+    return d.strftime(CHART_GRANULARITIES[granularity][1])
+
+def _chart_source(params, granularity):
+    """
+    (queryset, count aggregate, native sum aggregate, IDR sum aggregate,
+    bucket expression).
+
+    Amounts are converted per bucket, so buckets are never coarser than a
+    month; quarters and years are folded from months afterwards. Unfiltered
+    month-based charts read InvoiceRollup, everything else the invoices.
+    """
+    bucket = granularity if granularity in ("day", "week") else "month"
+    if bucket == "month" and _filter_signature(params) == "all":
+        return (
+            InvoiceRollup.objects.order_by(), Sum("invoice_count"),
+            Sum("amount_sum"), Sum("amount_idr_sum"), F("month"),
+        )
+    trunc = CHART_GRANULARITIES[bucket][0]
+    return _filter_invoices(params).order_by(), Count("id"), Sum("amount"), Sum("amount_idr"), trunc("date")
+
+def _chart_data(params, granularity=CHART_DEFAULT_GRANULARITY):
+    """
+    Build the chart payload for every currency at once.
+
+    Each chart is one GROUP BY (dimension, bucket) in SQL over the filtered
+    invoices, or over InvoiceRollup when nothing is filtered, also split
+    by currency: amounts in the target currency are summed as they are,
+    the rest from the stored IDR amounts (Invoice.amount_idr). Receivers
+    are kept complete and sorted by amount; api_charts trims them to
+    top-N + "Other".
+    """
+    qs, count, total, total_idr, bucket = _chart_source(params, granularity)
+
+    qs_status = qs.values("status").annotate(n=count).order_by("status")
     count_by_status = {
         "labels": [x["status"] for x in qs_status],
         "values": [x["n"] for x in qs_status],
     }
 
-    # Query 2: Amount by remark with select_related (no N+1!)
-    qs_remark = (
-        Invoice.objects
-        .select_related('remark')  # Load remark in same query
-        .values('remark__name', 'currency', 'amount')
+    # the bucket stays in every GROUP BY so each one is converted at its own
+    # rate, and the currency so native amounts need no conversion at all
+    qs = qs.annotate(bucket=bucket)
+    by_remark = list(
+        qs.values("remark__name", "bucket", "currency")
+        .annotate(total=total, total_idr=total_idr)
+        .order_by("remark__name", "bucket")
+    )
+    for g in by_remark:
+        g["remark__name"] = g["remark__name"] or "-"
+    by_period = list(
+        qs.values("bucket", "currency").annotate(total=total, total_idr=total_idr).order_by("bucket")
+    )
+    by_receiver = list(
+        qs.values("to_party", "bucket", "currency")
+        .annotate(total=total, total_idr=total_idr)
+        .order_by("to_party", "bucket")
     )
-    amount_by_remark = {}
-    for item in qs_remark:
-        remark_name = item['remark__name'] or "-"
-        converted_amount = convert_currency(
-            float(item['amount']), 
-            item['currency'], 
-            target_currency
-        )
-        amount_by_remark[remark_name] = amount_by_remark.get(remark_name, 0) + converted_amount
-    
-    # Query 3: Amount by month - use TruncMonth for efficient grouping
-    qs_month = Invoice.objects.values('date', 'currency', 'amount')
-    amount_by_month = {}
-    for item in qs_month:
-        month = item['date'].strftime("%Y-%m")
-        converted_amount = convert_currency(
-            float(item['amount']), 
-            item['currency'], 
-            target_currency
-        )
-        amount_by_month[month] = amount_by_month.get(month, 0) + converted_amount
-    
-    # Query 4: Top receivers
-    qs_receiver = Invoice.objects.values('to_party', 'currency', 'amount')
-    amount_by_receiver = {}
-    for item in qs_receiver:
-        converted_amount = convert_currency(
-            float(item['amount']), 
-            item['currency'], 
-            target_currency
-        )
-        amount_by_receiver[item['to_party']] = amount_by_receiver.get(item['to_party'], 0) + converted_amount
 
-    result = {
-        "count_by_status": count_by_status,
-        "amount_by_remark": {
-            "labels": list(amount_by_remark.keys()),
-            "values": list(amount_by_remark.values()),
-        },
-        "amount_by_month": {
-            "labels": sorted(amount_by_month.keys()),
-            "values": [amount_by_month[k] for k in sorted(amount_by_month.keys())],
-        },
-        "amount_by_receiver": {
-            "labels": list(amount_by_receiver.keys()),
-            "values": list(amount_by_receiver.values()),
-        },
-        "currency": target_currency,
+    rates = get_rate_table()
+    results = {}
+    for cur in CHART_CURRENCIES:
+        remark = _fold(by_remark, "remark__name", cur, rates)
+        period = _fold(by_period, lambda g: _period_label(g["bucket"], granularity), cur, rates)
+        receiver = sorted(_fold(by_receiver, "to_party", cur, rates).items(), key=lambda kv: kv[1], reverse=True)
+        series = {
+            "labels": sorted(period.keys()),
+            "values": [period[k] for k in sorted(period.keys())],
+        }
+        results[cur] = {
+            "count_by_status": count_by_status,
+            "amount_by_remark": {
+                "labels": list(remark.keys()),
+                "values": list(remark.values()),
+            },
+            "amount_by_period": series,
+            "amount_by_receiver": {
+                "labels": [k for k, _ in receiver],
+                "values": [v for _, v in receiver],
+            },
+            "granularity": granularity,
+            "currency": cur,
+        }
+        if granularity == "month":
+            # name used before granularity existed
+            results[cur]["amount_by_month"] = series
+    return results
+
+def _top_n(series, n):
+    """Keep the n largest entries of a sorted {labels, values} series, folding the rest into "Other"."""
+    labels, values = series["labels"], series["values"]
+    if len(labels) <= n:
+        return series
+    return {
+        "labels": labels[:n] + ["Other"],
+        "values": values[:n] + [sum(values[n:])],
     }
-    
-    # Cache for 5 minutes
-    cache.set(cache_key, result, 300)
-    
+
+@login_required
+@conditional_on(INVOICES)
+def api_charts(request):
+    """
+    Charts of the invoices matching the api_invoices filters (including
+    ?currency=, the currency filter), bucketed by ?granularity=day|week|
+    month|quarter|year and shown in ?convert_to= (default IDR).
+    All three currencies come out of one set of grouped queries and are
+    cached together per (filters, granularity), so switching currency is
+    free. ?top= limits the receiver chart (default 10).
+
+    Deprecated: without ?convert_to=, ?currency= is still read as the target
+    currency (its meaning before the filters were added) and filters nothing.
+    """
+    params = request.GET
+    if "convert_to" not in params and params.get("currency"):
+        logger.warning(
+            "api_charts: ?currency= without ?convert_to= is deprecated; "
+            "treating it as convert_to (use convert_to=, or both to filter)"
+        )
+        params = params.copy()
+        params["convert_to"] = params.pop("currency")[-1]
+    target_currency = params.get('convert_to', 'IDR')
+    if target_currency not in CHART_CURRENCIES:
+        target_currency = 'IDR'
+    granularity = request.GET.get('granularity') or CHART_DEFAULT_GRANULARITY
+    if granularity not in CHART_GRANULARITIES:
+        return JsonResponse({
+            "ok": False,
+            "msg": f"Invalid granularity. Use one of: {', '.join(CHART_GRANULARITIES)}",
+        }, status=400)
+    try:
+        top = int(request.GET.get('top') or CHART_TOP_RECEIVERS)
+    except ValueError:
+        top = CHART_TOP_RECEIVERS
+    top = max(1, min(top, CHART_MAX_TOP))
+
+    # Fresh for 5 minutes, then served stale while one request rebuilds it
+    result = get_or_compute(
+        'chart_data', lambda: _chart_data(params, granularity), 1800,
+        _filter_signature(params), granularity, soft_ttl=300,
+    )[target_currency]
+    result = dict(result, amount_by_receiver=_top_n(result["amount_by_receiver"], top))
     return JsonResponse(result)
 
 @login_required
@@ -0,0 +1,77 @@
+# dashboard/views_exports.py
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+from .exports import EXCEL_AVAILABLE, EXPORT_FORMATS
+from .jobs import enqueue_export
+from .models import ExportJob
+
+# filter params each export kind understands (same names as the list APIs)
+JOB_FILTER_PARAMS = {
+    ExportJob.Kind.INVOICES: ("q", "product", "remark_id", "currency", "status", "from", "to", "daterange"),
+    ExportJob.Kind.LOG: ("user", "action", "q", "daterange", "archive"),
+}
+
+
+def _job_payload(job):
+    data = {
+        "id": job.pk,
+        "kind": job.kind,
+        "format": job.format,
+        "status": job.status,
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+        "progress": round(job.progress, 4),
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": reverse("dashboard:api-export-job-status", args=[job.pk]),
+        "download_url": None,
+    }
+    if job.status == ExportJob.Status.DONE and job.file:
+        data["download_url"] = reverse("dashboard:api-export-job-download", args=[job.pk])
+    return data
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_export_job_create(request):
+    """Queue an export of the current filter set; returns immediately with the job id."""
+    kind = (request.POST.get("kind") or "invoices").upper()
+    if kind not in ExportJob.Kind.values:
+        return JsonResponse({"ok": False, "msg": "Invalid kind. Use invoices or log."}, status=400)
+
+    fmt = (request.POST.get("format") or "xlsx").lower()
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"ok": False, "msg": f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+    if fmt == "xlsx" and not EXCEL_AVAILABLE:
+        return JsonResponse({"ok": False, "msg": "openpyxl not installed"}, status=500)
+
+    params = {
+        k: request.POST.get(k)
+        for k in JOB_FILTER_PARAMS[kind]
+        if request.POST.get(k)
+    }
+    job = enqueue_export(request.user, kind, fmt, params)
+    return JsonResponse({"ok": True, **_job_payload(job)}, status=202)
+
+
+@login_required
+def api_export_job_status(request, pk: int):
+    job = get_object_or_404(ExportJob, pk=pk, created_by=request.user)
+    return JsonResponse(_job_payload(job))
+
+
+@login_required
+def api_export_job_download(request, pk: int):
+    job = get_object_or_404(ExportJob, pk=pk, created_by=request.user)
+    if job.status != ExportJob.Status.DONE or not job.file:
+        return JsonResponse({"ok": False, "msg": "Export is not ready"}, status=409)
+    try:
+        name = job.file.name.rsplit("/", 1)[-1]
+        return FileResponse(job.file.open("rb"), as_attachment=True, filename=name)
+    except FileNotFoundError:
+        raise Http404("File not found")
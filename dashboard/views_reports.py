@@ -0,0 +1,174 @@
+# dashboard/views_reports.py
+import hashlib
+import json
+from decimal import Decimal
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.http import JsonResponse
+
+from .caching import INVOICES, get_or_compute
+from .conditional import conditional_on
+from .models import InvoiceRollup
+from .rates import get_rate_table
+from .views import CHART_CURRENCIES, _filter_invoices, _filter_signature, _period_label
+
+# dimension -> (expression over Invoice, expression over InvoiceRollup or None)
+PIVOT_DIMENSIONS = {
+    "product": (F("product"), None),
+    "remark": (F("remark__name"), F("remark__name")),
+    "status": (F("status"), F("status")),
+    "currency": (F("currency"), F("currency")),
+    "from": (F("from_party"), None),
+    "to": (F("to_party"), F("to_party")),
+    "day": (TruncDay("date"), None),
+    "week": (TruncWeek("date"), None),
+    "month": (TruncMonth("date"), F("month")),
+    "quarter": (TruncQuarter("date"), TruncQuarter("month")),
+    "year": (TruncYear("date"), TruncYear("month")),
+}
+PIVOT_TIME_DIMENSIONS = ("day", "week", "month", "quarter", "year")
+# count, native amount (needs the currency dimension), stored IDR amount,
+# amount converted into ?convert_to= at each month's (or day's/week's) rate
+PIVOT_MEASURES = ("count", "amount", "amount_idr", "converted")
+PIVOT_MAX_DIMENSIONS = 4
+PIVOT_MAX_CELLS = 20000
+# groups read for one pivot when converted amounts add a month bucket the
+# pivot itself doesn't have (otherwise every group is a cell)
+PIVOT_MAX_GROUPS = 100_000
+
+
+class PivotError(ValueError):
+    pass
+
+
+def _split(value):
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def parse_pivot_spec(params):
+    """Validate ?rows=&cols=&measures=&convert_to= into a spec dict; raises PivotError."""
+    rows, cols = _split(params.get("rows")), _split(params.get("cols"))
+    measures = _split(params.get("measures")) or ["count"]
+    dims = rows + cols
+    if not rows:
+        raise PivotError("Give at least one row dimension in ?rows=.")
+    unknown = [d for d in dims if d not in PIVOT_DIMENSIONS]
+    if unknown:
+        raise PivotError(f"Unknown dimension {unknown[0]!r}. Use: {', '.join(PIVOT_DIMENSIONS)}")
+    if len(set(dims)) != len(dims) or len(dims) > PIVOT_MAX_DIMENSIONS:
+        raise PivotError(f"Use up to {PIVOT_MAX_DIMENSIONS} distinct dimensions.")
+    if sum(d in PIVOT_TIME_DIMENSIONS for d in dims) > 1:
+        raise PivotError("Use at most one time dimension.")
+    bad = [m for m in measures if m not in PIVOT_MEASURES]
+    if bad:
+        raise PivotError(f"Unknown measure {bad[0]!r}. Use: {', '.join(PIVOT_MEASURES)}")
+    if "amount" in measures and "currency" not in dims and params.get("currency") in (None, "", "ALL"):
+        raise PivotError("The native amount needs the currency dimension or a currency filter.")
+    convert_to = params.get("convert_to") or "IDR"
+    if convert_to not in CHART_CURRENCIES:
+        raise PivotError(f"Invalid convert_to. Use one of: {', '.join(CHART_CURRENCIES)}")
+    return {"rows": rows, "cols": cols, "measures": measures, "convert_to": convert_to}
+
+
+def _spec_signature(params, spec):
+    raw = json.dumps([spec["rows"], spec["cols"], spec["measures"], spec["convert_to"]])
+    return f"{_filter_signature(params)}:{hashlib.sha1(raw.encode()).hexdigest()[:12]}"
+
+
+def _label(value, dim):
+    if value is None:
+        return "-"
+    if dim in PIVOT_TIME_DIMENSIONS:
+        return _period_label(value, dim)
+    return value
+
+
+def build_pivot(params, spec):
+    """
+    One GROUP BY over the dimensions (plus the rate bucket when amounts are
+    converted), folded into a rows x cols matrix per measure. Unfiltered
+    pivots over rollup dimensions read InvoiceRollup instead of the invoices.
+    """
+    dims = spec["rows"] + spec["cols"]
+    use_rollup = _filter_signature(params) == "all" and all(PIVOT_DIMENSIONS[d][1] is not None for d in dims)
+    if use_rollup:
+        qs = InvoiceRollup.objects.order_by()
+        aggregates = {"n": Sum("invoice_count"), "amount": Sum("amount_sum"), "amount_idr": Sum("amount_idr_sum")}
+    else:
+        qs = _filter_invoices(params).order_by()
+        aggregates = {"n": Count("id"), "amount": Sum("amount"), "amount_idr": Sum("amount_idr")}
+
+    columns = {f"d{i}": PIVOT_DIMENSIONS[d][1 if use_rollup else 0] for i, d in enumerate(dims)}
+    max_groups = PIVOT_MAX_CELLS
+    if "converted" in spec["measures"]:
+        # convert at the rate of the day/week/month bucket, never coarser than a month
+        time_dims = [d for d in dims if d in ("day", "week", "month")]
+        rate_dim = time_dims[0] if time_dims else "month"
+        columns["rate_date"] = PIVOT_DIMENSIONS[rate_dim][1 if use_rollup else 0]
+        if not time_dims:
+            max_groups = PIVOT_MAX_GROUPS
+    # stop reading one group past the limit instead of loading them all
+    groups = list(qs.annotate(**columns).values(*columns).annotate(**aggregates)[:max_groups + 1])
+    if len(groups) > max_groups:
+        raise PivotError(f"The pivot has more than {max_groups} groups; add filters or fewer dimensions.")
+
+    converted = [None] * len(groups)
+    if "converted" in spec["measures"]:
+        converted = get_rate_table().convert_many(
+            ((g["amount_idr"], "IDR", g["rate_date"]) for g in groups), spec["convert_to"]
+        )
+
+    n_rows = len(spec["rows"])
+    cells = {}
+    for g, conv in zip(groups, converted):
+        key = tuple(_label(g[f"d{i}"], d) for i, d in enumerate(dims))
+        cell = cells.setdefault((key[:n_rows], key[n_rows:]), {"count": 0, "amount": Decimal(0),
+                                                                "amount_idr": Decimal(0), "converted": Decimal(0)})
+        cell["count"] += g["n"]
+        cell["amount"] += Decimal(g["amount"] or 0)
+        cell["amount_idr"] += Decimal(g["amount_idr"] or 0)
+        if conv is not None:
+            cell["converted"] += conv
+
+    row_keys = sorted({r for r, _ in cells}, key=lambda k: [str(v) for v in k])
+    col_keys = sorted({c for _, c in cells}, key=lambda k: [str(v) for v in k])
+    if len(row_keys) * len(col_keys) > PIVOT_MAX_CELLS:
+        raise PivotError(f"The pivot has more than {PIVOT_MAX_CELLS} cells; add filters or fewer dimensions.")
+
+    def value(cell, measure):
+        if cell is None:
+            return None
+        return cell[measure] if measure == "count" else round(float(cell[measure]), 2)
+
+    return {
+        "rows": spec["rows"],
+        "cols": spec["cols"],
+        "measures": spec["measures"],
+        "convert_to": spec["convert_to"],
+        "row_keys": [list(k) for k in row_keys],
+        "col_keys": [list(k) for k in col_keys],
+        "data": {
+            m: [[value(cells.get((r, c)), m) for c in col_keys] for r in row_keys]
+            for m in spec["measures"]
+        },
+    }
+
+
+@login_required
+@conditional_on(INVOICES)
+def api_pivot(request):
+    """
+    Cross-tab of the invoices matching the api_invoices filters, e.g.
+    ?rows=product,month&cols=status&measures=count,converted&convert_to=USD.
+    Empty cells are null.
+    """
+    try:
+        spec = parse_pivot_spec(request.GET)
+        result = get_or_compute(
+            "pivot", lambda: build_pivot(request.GET, spec), 600, _spec_signature(request.GET, spec)
+        )
+    except PivotError as e:
+        return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+    return JsonResponse(result)
@@ -52,8 +52,24 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'log.middleware.AuditBatchMiddleware',
 ]
 
+# Audit log writes (see log/utils.py): "sync", "request" (one INSERT per
+# request) or "deferred" (background writer thread; long-running workers only)
+AUDIT_LOG_MODE = os.environ.get('AUDIT_LOG_MODE', 'request')
+AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+
+# Activity-log retention (`manage.py archive_logs`): keep this many whole
+# months in the log table; older entries go to the archive table or to
+# monthly NDJSON.gz files in default storage ("table" / "file")
+LOG_RETENTION_MONTHS = int(os.environ.get('LOG_RETENTION_MONTHS', 12))
+LOG_ARCHIVE_TARGET = os.environ.get('LOG_ARCHIVE_TARGET', 'table')
+
+# Export jobs still RUNNING this many seconds after they started are taken
+# to belong to a worker that died, and `run_export_jobs` marks them FAILED
+EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', 3600))
+
 ROOT_URLCONF = 'invoiceManagement.urls'
 
 TEMPLATES = [
@@ -102,15 +118,48 @@ else:
     }
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'invoice-cache',
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+# Cache tier: "locmem" (per process), "db" (cache table shared by every
+# instance; run `manage.py createcachetable dashboard_cache`) or "file" (a directory shared
+# by the processes of one host). Shared tiers get an in-process L1 in front.
+CACHE_TIER = os.environ.get('CACHE_TIER', 'db' if DATABASE_URL else 'locmem')
+
+SHARED_CACHE_TIERS = {
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'dashboard_cache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/invoice-cache'),
+    },
+}
+
+if CACHE_TIER in SHARED_CACHE_TIERS:
+    CACHES = {
+        'default': {
+            'BACKEND': 'dashboard.cache_backends.TieredCache',
+            'LOCATION': 'invoice-cache',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'SHARED': {
+                    **SHARED_CACHE_TIERS[CACHE_TIER],
+                    'OPTIONS': {'MAX_ENTRIES': 10000},
+                },
+                'L1_TIMEOUT': int(os.environ.get('CACHE_L1_TIMEOUT', 30)),
+                'L1_MAX_ENTRIES': 1000,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'invoice-cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000,
+            }
         }
     }
-}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from log import retention
+from log.models import LogArchiveFile, LogEntry
+
+
+class Command(BaseCommand):
+    help = "Move activity-log entries older than the retention period into the archive table or files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=None,
+                            help="Keep this many whole months (default: LOG_RETENTION_MONTHS).")
+        parser.add_argument("--to", choices=retention.ARCHIVE_TARGETS, default=None,
+                            help="Archive into the ArchivedLogEntry table or NDJSON.gz files "
+                                 "(default: LOG_ARCHIVE_TARGET).")
+        parser.add_argument("--batch", type=int, default=retention.ARCHIVE_BATCH)
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived.")
+        parser.add_argument("--compact", action="store_true", help="VACUUM the log table afterwards.")
+        parser.add_argument("--load", type=int, metavar="ARCHIVE_ID",
+                            help="Load an archive file back into the archive table, then exit.")
+
+    def handle(self, *args, **options):
+        if options["load"] is not None:
+            try:
+                archive = LogArchiveFile.objects.get(pk=options["load"])
+            except LogArchiveFile.DoesNotExist:
+                raise CommandError(f"No log archive file {options['load']}")
+            n = retention.load_file(archive, batch_size=options["batch"])
+            self.stdout.write(self.style.SUCCESS(f"Loaded {n} entries from {archive.file.name}"))
+            return
+
+        months = options["months"] if options["months"] is not None else settings.LOG_RETENTION_MONTHS
+        if months < 1:
+            raise CommandError("--months must be at least 1")
+        target = options["to"] or settings.LOG_ARCHIVE_TARGET
+        if target not in retention.ARCHIVE_TARGETS:
+            raise CommandError(f"Unknown archive target {target!r}")
+        cutoff = retention.retention_cutoff(months)
+
+        old = LogEntry.objects.filter(created_at__lt=cutoff).count()
+        self.stdout.write(f"{old} entries created before {cutoff:%Y-%m-%d} (keeping {months} months)")
+        if options["dry_run"] or not old:
+            return
+
+        if target == "table":
+            moved = retention.archive_to_table(cutoff, batch_size=options["batch"])
+        else:
+            moved = retention.archive_to_files(cutoff, batch_size=options["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} entries to {target}"))
+        if options["compact"]:
+            retention.compact()
+            self.stdout.write("Compacted the log table")
@@ -0,0 +1,12 @@
+from .utils import audit_batch
+
+
+class AuditBatchMiddleware:
+    """Collect a request's audit log entries and write them with one INSERT at the end."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit_batch():
+            return self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logentry',
+            name='action',
+            field=models.CharField(choices=[('CREATE_INVOICE', 'Create Invoice'), ('UPDATE_INVOICE', 'Update Invoice'), ('DELETE_INVOICE', 'Delete Invoice'), ('CHANGE_STATUS', 'Change Invoice Status'), ('CREATE_REMARK', 'Create Invoice Remark'), ('DELETE_REMARK', 'Delete Invoice Remark'), ('REORDER_REMARK', 'Reorder Invoice Remark'), ('IMPORT_INVOICES', 'Import Invoices')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log', '0002_logentry_import_action'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['-created_at', '-id'], name='idx_log_created_id'),
+        ),
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='log_logentr_created_7b0d6e_idx',
+        ),
+    ]
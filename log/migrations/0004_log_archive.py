@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:53
+
+import log.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log', '0003_logentry_created_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogArchiveFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('file', models.FileField(upload_to=log.models.log_archive_path)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLogEntry',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('username_cache', models.CharField(blank=True, default='', max_length=150)),
+                ('action', models.CharField(max_length=32)),
+                ('entity_type', models.CharField(max_length=16)),
+                ('entity_id', models.IntegerField(blank=True, null=True)),
+                ('entity_label', models.CharField(blank=True, default='', max_length=255)),
+                ('details', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='idx_logarchive_created_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+from dashboard import search
+
+COLUMNS = ('details', 'entity_label', 'username_cache')
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection, 'log_logentry', COLUMNS)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection, 'log_logentry', COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('log', '0004_log_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['username_cache'], name='idx_log_username'),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
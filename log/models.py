@@ -10,6 +10,7 @@ class LogEntry(models.Model):
         CREATE_REMARK  = "CREATE_REMARK",  "Create Invoice Remark"
         DELETE_REMARK  = "DELETE_REMARK",  "Delete Invoice Remark"
         REORDER_REMARK = "REORDER_REMARK", "Reorder Invoice Remark"
+        IMPORT_INVOICES = "IMPORT_INVOICES", "Import Invoices"
 
     class Entity(models.TextChoices):
         INVOICE = "INVOICE", "Invoice"
@@ -30,11 +31,58 @@ class LogEntry(models.Model):
     class Meta:
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["-created_at"]),
+            # newest-first pages and keyset cursors on (created_at, id)
+            models.Index(fields=["-created_at", "-id"], name="idx_log_created_id"),
             models.Index(fields=["action"]),
             models.Index(fields=["entity_type"]),
+            # user filter on the name cached at write time, no auth_user join
+            models.Index(fields=["username_cache"], name="idx_log_username"),
         ]
 
     def __str__(self):
         who = self.username_cache or (self.user and self.user.get_username()) or "Unknown"
         return f"[{self.created_at:%Y-%m-%d %H:%M}] {who} - {self.get_action_display()} ({self.entity_type})"
+
+
+class ArchivedLogEntry(models.Model):
+    """
+    A LogEntry moved out of the hot table by `manage.py archive_logs`
+    (same id). Queried with ?archive=1 on the log APIs.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    username_cache = models.CharField(max_length=150, blank=True, default="")
+    action = models.CharField(max_length=32)
+    entity_type = models.CharField(max_length=16)
+    entity_id = models.IntegerField(null=True, blank=True)
+    entity_label = models.CharField(max_length=255, blank=True, default="")
+    details = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="idx_logarchive_created_id"),
+        ]
+
+    def __str__(self):
+        return f"[{self.created_at:%Y-%m-%d %H:%M}] {self.username_cache or 'Unknown'} - {self.action} (archived)"
+
+
+def log_archive_path(instance, filename):
+    return f"log-archive/{filename}"
+
+class LogArchiveFile(models.Model):
+    """One month of log entries written to default storage as NDJSON (gzip)."""
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    rows = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to=log_archive_path)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-start"]
+
+    def __str__(self):
+        return f"Log archive {self.start:%Y-%m-%d} – {self.end:%Y-%m-%d} ({self.rows} rows)"
@@ -0,0 +1,147 @@
+# log/retention.py
+"""
+Retention for the activity log.
+
+Entries older than settings.LOG_RETENTION_MONTHS whole months are moved
+out of LogEntry, in batches, either into the ArchivedLogEntry table
+(queried with ?archive=1 on the log APIs) or into one gzipped NDJSON file
+per month in default storage (LogArchiveFile; load_file() brings a file
+back into the archive table when it needs to be queried).
+"""
+import gzip
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from dashboard.caching import LOG, bump_data_version
+from dashboard.exports import iter_ndjson_gz
+from dashboard.pagination import keyset_iterator
+
+from .models import ArchivedLogEntry, LogArchiveFile, LogEntry
+
+ARCHIVE_TARGETS = ("table", "file")
+ARCHIVE_BATCH = 5000
+ARCHIVE_FIELDS = (
+    "id", "user_id", "username_cache", "action", "entity_type",
+    "entity_id", "entity_label", "details", "created_at",
+)
+
+
+def _month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(dt, months):
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+def retention_cutoff(months=None, now=None):
+    """Start of the oldest month kept: entries created before it are archived."""
+    if months is None:
+        months = settings.LOG_RETENTION_MONTHS
+    now = timezone.localtime(now or timezone.now())
+    return _add_months(_month_start(now), -months)
+
+
+def _delete_ids(ids):
+    # nothing references LogEntry and it has no delete signals: one DELETE
+    LogEntry.objects.filter(id__in=ids).delete()
+
+
+def archive_to_table(cutoff, batch_size=ARCHIVE_BATCH):
+    """Move entries created before `cutoff` into ArchivedLogEntry; returns the number moved."""
+    moved = 0
+    old = LogEntry.objects.filter(created_at__lt=cutoff).order_by("created_at", "id")
+    while True:
+        with transaction.atomic():
+            rows = list(old.values(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ArchivedLogEntry.objects.bulk_create(
+                [ArchivedLogEntry(**r) for r in rows], batch_size=1000, ignore_conflicts=True
+            )
+            _delete_ids([r["id"] for r in rows])
+        moved += len(rows)
+    if moved:
+        bump_data_version(LOG)
+    return moved
+
+
+def archive_to_files(cutoff, batch_size=ARCHIVE_BATCH):
+    """
+    Write entries created before `cutoff` to one NDJSON.gz file per month and
+    delete them once the file is saved; returns the number moved.
+    """
+    moved = 0
+    while True:
+        first = LogEntry.objects.filter(created_at__lt=cutoff).order_by("created_at", "id").first()
+        if first is None:
+            break
+        start = _month_start(timezone.localtime(first.created_at))
+        end = min(_add_months(start, 1), cutoff)
+        month = LogEntry.objects.filter(created_at__gte=start, created_at__lt=end)
+
+        seen = {"rows": 0, "max_id": 0}
+        def rows():
+            for r in keyset_iterator(month.values(*ARCHIVE_FIELDS), ("created_at", "id"), chunk_size=batch_size):
+                seen["rows"] += 1
+                seen["max_id"] = max(seen["max_id"], r["id"])
+                yield tuple(r[f] for f in ARCHIVE_FIELDS)
+
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in iter_ndjson_gz(ARCHIVE_FIELDS, rows()):
+                tmp.write(chunk)
+            tmp.seek(0)
+            archive = LogArchiveFile(start=start, end=end, rows=seen["rows"])
+            archive.file.save(f"log-{start:%Y-%m}.ndjson.gz", File(tmp), save=True)
+
+        # only what went into the file (later inserts back-dated into this
+        # month have higher ids and wait for the next run)
+        written = month.filter(id__lte=seen["max_id"]).order_by("id")
+        while True:
+            ids = list(written.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            _delete_ids(ids)
+        moved += seen["rows"]
+    if moved:
+        bump_data_version(LOG)
+    return moved
+
+
+def load_file(archive, batch_size=ARCHIVE_BATCH):
+    """Copy the entries of a LogArchiveFile into ArchivedLogEntry; returns the number read."""
+    def flush(batch):
+        ArchivedLogEntry.objects.bulk_create(batch, batch_size=1000, ignore_conflicts=True)
+
+    n, batch = 0, []
+    with archive.file.open("rb") as raw, gzip.open(raw, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            r["created_at"] = parse_datetime(r["created_at"])
+            batch.append(ArchivedLogEntry(**{f: r.get(f) for f in ARCHIVE_FIELDS}))
+            if len(batch) >= batch_size:
+                flush(batch)
+                n += len(batch)
+                batch = []
+    if batch:
+        flush(batch)
+        n += len(batch)
+    if n:
+        bump_data_version(LOG)
+    return n
+
+
+def compact():
+    """Give the space of deleted rows back (VACUUM) and refresh planner statistics."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"VACUUM ANALYZE {LogEntry._meta.db_table}")
+        elif connection.vendor == "sqlite":
+            cursor.execute("VACUUM")
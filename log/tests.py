@@ -1,3 +1,51 @@
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+from dashboard.pagination import keyset_q
+
+from .models import LogEntry
+from .views import LOG_ORDERING
+
+
+class LogPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user("tester", password="pw")
+        LogEntry.objects.bulk_create([
+            LogEntry(action=LogEntry.Action.CREATE_INVOICE, entity_type=LogEntry.Entity.INVOICE,
+                     entity_id=i, details=f"entry {i}")
+            for i in range(25)
+        ])
+        start = timezone.now() - timedelta(days=30)
+        for i, pk in enumerate(LogEntry.objects.order_by("id").values_list("id", flat=True)):
+            # a few entries share a timestamp, so id has to break ties
+            LogEntry.objects.filter(pk=pk).update(created_at=start + timedelta(hours=i // 2))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @skipUnless(connection.vendor == "sqlite", "checks the SQLite query plan")
+    def test_page_seeks_on_created_at(self):
+        qs = LogEntry.objects.order_by(*LOG_ORDERING).values("id", "created_at")
+        last = qs[10]
+        plan = qs.filter(keyset_q(LOG_ORDERING, [last["created_at"], last["id"]]))[:5].explain()
+        self.assertRegex(plan, r"SEARCH log_logentry USING (COVERING )?INDEX \w+ \(created_at<\?\)")
+        self.assertNotIn("SCAN log_logentry", plan)
 
-# Create your tests here.
+    def test_cursor_pages_cover_every_entry_once(self):
+        details, params = [], {"limit": 4}
+        while True:
+            page = self.client.get("/log/api/entries/", params, secure=True).json()
+            details += [item["details"] for item in page["items"]]
+            if not page["next"]:
+                break
+            params = {"limit": 4, "cursor": page["next"]}
+        expected = LogEntry.objects.order_by(*LOG_ORDERING).values_list("details", flat=True)
+        self.assertEqual(details, list(expected))
@@ -7,4 +7,6 @@ urlpatterns = [
     path("", views.page, name="page"),
     path("api/entries/", views.api_entries, name="api-entries"),
     path("api/download/", views.api_download, name="api-download"),
+    path("api/archives/", views.api_archives, name="api-archives"),
+    path("api/archives/<int:pk>/download/", views.api_archive_download, name="api-archive-download"),
 ]
@@ -1,14 +1,53 @@
+"""
+Audit log writer.
+
+log_action / log_actions build LogEntry rows; where they go depends on
+settings.AUDIT_LOG_MODE:
+
+- "sync": inserted immediately, one INSERT per call.
+- "request" (default): inside an audit_batch() (AuditBatchMiddleware opens
+  one per request) entries are collected and written with one bulk_create
+  when the batch ends -- on commit if it ends inside a transaction. An
+  entry logged inside a transaction or savepoint joins the batch only when
+  that commits, so a rolled-back atomic() block loses its entries with its
+  writes. Outside a batch: immediately.
+- "deferred": as "request", but the flush hands the entries to a
+  background writer thread through a bounded queue. When the queue is full
+  the caller writes them itself; the queue is drained at interpreter exit.
+  Only for long-running workers; serverless functions may be frozen
+  before the thread gets to run.
+"""
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from dashboard.caching import LOG, bump_data_version
+
 from .models import LogEntry
 
-def log_action(user, *, action, entity_type, entity_id=None, entity_label="", details=""):
-    username_cache = ""
+logger = logging.getLogger(__name__)
+
+AUDIT_WRITE_BATCH = 500
+
+def _mode():
+    return getattr(settings, "AUDIT_LOG_MODE", "request")
+
+def _username(user):
     if user:
         try:
-            username_cache = getattr(user, "get_full_name", lambda: "")() or user.get_username()
+            return getattr(user, "get_full_name", lambda: "")() or user.get_username()
         except Exception:
-            username_cache = ""
+            return ""
+    return ""
 
-    return LogEntry.objects.create(
+def _entry(user, username_cache, *, action, entity_type, entity_id=None, entity_label="", details=""):
+    return LogEntry(
         user=user if getattr(user, "is_authenticated", False) else None,
         username_cache=username_cache[:150],
         action=action,
@@ -17,3 +56,163 @@ def log_action(user, *, action, entity_type, entity_id=None, entity_label="", de
         entity_label=entity_label or "",
         details=details or "",
     )
+
+def write_entries(entries):
+    """Insert `entries` now (one INSERT per AUDIT_WRITE_BATCH) and invalidate the log caches."""
+    if not entries:
+        return entries
+    if len(entries) == 1:
+        entries[0].save()
+    else:
+        LogEntry.objects.bulk_create(entries, batch_size=AUDIT_WRITE_BATCH)
+    bump_data_version(LOG)
+    return entries
+
+
+# ---------- deferred writer ----------
+class DeferredWriter:
+    """Background thread writing queued entries in batches of up to AUDIT_WRITE_BATCH."""
+
+    def __init__(self, maxsize=10000, put_timeout=0.5):
+        self.queue = queue.Queue(maxsize)
+        self.put_timeout = put_timeout
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, entries):
+        self._ensure_started()
+        for i, entry in enumerate(entries):
+            try:
+                self.queue.put(entry, timeout=self.put_timeout)
+            except queue.Full:
+                # back-pressure: the caller writes what doesn't fit
+                write_entries(list(entries[i:]))
+                return
+
+    def _take(self, batch):
+        """Add queued entries to `batch` up to the batch size; False once the stop marker is seen."""
+        while len(batch) < AUDIT_WRITE_BATCH:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return True
+            if item is None:
+                return False
+            batch.append(item)
+        return True
+
+    def _write(self, batch):
+        try:
+            write_entries(batch)
+        except Exception:
+            logger.exception("Failed to write %d audit log entries", len(batch))
+
+    def _run(self):
+        try:
+            running = True
+            while running:
+                item = self.queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                running = self._take(batch)
+                self._write(batch)
+        finally:
+            connections.close_all()
+
+    def flush(self, timeout=10):
+        """Write everything queued and stop the thread (the next submit restarts it)."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join(timeout)
+        # whatever the thread left behind (not started, or too slow)
+        while True:
+            batch = []
+            self._take(batch)
+            if not batch:
+                break
+            self._write(batch)
+
+
+_writer = DeferredWriter(maxsize=getattr(settings, "AUDIT_LOG_QUEUE_SIZE", 10000))
+atexit.register(_writer.flush)
+
+def flush_deferred(timeout=10):
+    """Write every entry still queued for the deferred writer."""
+    _writer.flush(timeout)
+
+
+# ---------- batching ----------
+_batch = contextvars.ContextVar("audit_batch", default=None)
+
+def _dispatch(entries):
+    if not entries:
+        return
+    if _mode() == "deferred":
+        _writer.submit(entries)
+    else:
+        write_entries(entries)
+
+@contextmanager
+def audit_batch():
+    """
+    Collect the entries logged inside the block and write them together
+    when the outermost batch exits (on commit, inside a transaction).
+    Entries logged inside atomic() are added by on_commit callbacks, which
+    run before the batch's own callback and are dropped with a savepoint.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    entries = []
+    token = _batch.set(entries)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: _dispatch(entries))
+        else:
+            _dispatch(entries)
+
+def _submit(entries):
+    buffered = _batch.get()
+    if _mode() == "sync":
+        write_entries(entries)
+    elif buffered is not None:
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: buffered.extend(entries))
+        else:
+            buffered.extend(entries)
+    elif connection.in_atomic_block:
+        # unbuffered writes inside a transaction share its fate
+        write_entries(entries)
+    else:
+        _dispatch(entries)
+    return entries
+
+
+def log_action(user, *, action, entity_type, entity_id=None, entity_label="", details=""):
+    """Record one action. The entry has no pk yet while it is buffered or queued."""
+    entry = _entry(
+        user, _username(user),
+        action=action, entity_type=entity_type, entity_id=entity_id,
+        entity_label=entity_label, details=details,
+    )
+    return _submit([entry])[0]
+
+
+def log_actions(user, entries):
+    """
+    Record several actions at the cost of one INSERT. `entries` are dicts
+    with the keyword arguments of log_action (action, entity_type, ...).
+    """
+    username_cache = _username(user)
+    return _submit([_entry(user, username_cache, **e) for e in entries])
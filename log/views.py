@@ -1,11 +1,22 @@
 # log/views.py
-from datetime import datetime
+import hashlib
+import json
+from datetime import datetime, timedelta
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
+from django.db import connections
 from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.utils.timezone import make_aware
-from .models import LogEntry
-from django.shortcuts import render
+from .models import ArchivedLogEntry, LogArchiveFile, LogEntry
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from dashboard.caching import LOG, get_or_compute
+from dashboard.conditional import conditional_on
+from dashboard.exports import EXCEL_AVAILABLE, EXPORT_FORMATS, export_response
+from dashboard.search import search_q
+from dashboard.pagination import InvalidCursor, decode_cursor, keyset_iterator, keyset_page
 
 @login_required
 def page(request):
@@ -33,104 +44,210 @@ def _parse_range_str(s: str):
     except Exception:
         return (None, None)
 
-def _filter_logs(request):
-    qs = LogEntry.objects.select_related("user").all()
-
-    user_q = (request.GET.get("user") or "").strip()
-    if user_q:
-        qs = qs.filter(
-            Q(user__username__icontains=user_q) |
-            Q(user__first_name__icontains=user_q) |
-            Q(user__last_name__icontains=user_q)
-        )
-
-    action = (request.GET.get("action") or "").strip()
+# log rows are short and most lists stop after a page, so an ordered scan
+# beats collecting every FTS match much earlier than for invoices
+LOG_SEARCH_DENSE = 10_000
+
+def _is_archive(params):
+    return params.get("archive") in ("1", "true")
+
+def _filter_logs(params):
+    """Filter the log, or with ?archive=1 the entries moved out by `manage.py archive_logs`."""
+    archive = _is_archive(params)
+    qs = ArchivedLogEntry.objects.all() if archive else LogEntry.objects.all()
+
+    # text filters go through the search index of the log table (see
+    # dashboard/search.py); the archive table is scanned
+    user_q = (params.get("user") or "").strip()
+    if user_q and archive:
+        qs = qs.filter(username_cache__icontains=user_q)
+    elif user_q:
+        # the name cached at write time, plus entries of users whose login
+        # name matches (the user table is small; no join on the log)
+        users = get_user_model().objects.filter(username__icontains=user_q).values("id")
+        qs = qs.filter(search_q(LogEntry, user_q, columns=("username_cache",), dense_docs=LOG_SEARCH_DENSE) | Q(user__in=users))
+
+    action = (params.get("action") or "").strip()
     if action:
         qs = qs.filter(action=action)
 
-    q = (request.GET.get("q") or "").strip()
-    if q:
-        qs = qs.filter(details__icontains=q)
+    q = (params.get("q") or "").strip()
+    if q and archive:
+        qs = qs.filter(Q(details__icontains=q) | Q(entity_label__icontains=q))
+    elif q:
+        qs = qs.filter(search_q(LogEntry, q, columns=("details", "entity_label"), dense_docs=LOG_SEARCH_DENSE))
 
-    dr = (request.GET.get("daterange") or "").strip()
+    dr = (params.get("daterange") or "").strip()
     start, end = _parse_range_str(dr)
     if start and end:
-        qs = qs.filter(created_at__date__range=(start.date(), end.date()))
+        # a plain timestamp range (end day inclusive) so the created_at index applies
+        qs = qs.filter(created_at__gte=start, created_at__lt=end + timedelta(days=1))
 
     return qs.order_by("-created_at")
 
+LOG_FILTER_PARAMS = ("user", "action", "q", "daterange", "archive")
+LOG_ORDERING = ("-created_at", "-id")
+LOG_ROW_FIELDS = ("id", "created_at", "action", "details", "username_cache")
+LOG_PAGE_LIMIT = 100
+LOG_PAGE_MAX_LIMIT = 500
+# approximate counts may be this old
+LOG_COUNT_TTL = 60
+# below this many rows (by the planner's estimate) an exact count is cheap
+LOG_EXACT_COUNT_BELOW = 10000
+
+def _log_filter_signature(params):
+    items = sorted((k, params.get(k).strip()) for k in LOG_FILTER_PARAMS if (params.get(k) or "").strip())
+    if not items:
+        return "all"
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()[:20]
+
+def _planner_estimate(qs):
+    """Row estimate from the PostgreSQL planner (no scan)."""
+    sql, params = qs.order_by().values("id").query.sql_with_params()
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _log_count(qs, params, mode):
+    """
+    (total, estimated) for ?count=exact|estimate. Estimates come from the
+    planner on PostgreSQL (exact when small), elsewhere from a count cached
+    for LOG_COUNT_TTL seconds across log writes.
+    """
+    if mode == "exact":
+        return qs.count(), False
+    if connections[qs.db].vendor == "postgresql":
+        estimate = _planner_estimate(qs)
+        if estimate >= LOG_EXACT_COUNT_BELOW:
+            return estimate, True
+        return qs.count(), False
+    total = get_or_compute(
+        "log_count", qs.count, LOG_COUNT_TTL, _log_filter_signature(params),
+        namespace=LOG, version="approx", soft_ttl=LOG_COUNT_TTL // 2,
+    )
+    return total, True
+
+def _log_cursor_value(field, raw):
+    if field == "created_at":
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+    return int(raw)
+
+def _log_row(r, action_labels):
+    return {
+        "user": r["username_cache"] or "-",
+        "action": action_labels.get(r["action"], r["action"]),
+        "details": r["details"],
+        "date": r["created_at"].strftime("%Y-%m-%d %H:%M"),
+    }
+
 @login_required
+@conditional_on(LOG)
 def api_entries(request):
-    qs = _filter_logs(request)
-    limit = int(request.GET.get("limit", 100))
-    offset = int(request.GET.get("offset", 0))
-    total = qs.count()
-    items = [{
-        "user": (le.user.get_full_name() or le.user.get_username()),
-        "action": le.get_action_display() if hasattr(le, "get_action_display") else le.action,
-        "details": le.details,
-        "date": le.created_at.strftime("%Y-%m-%d %H:%M"),
-    } for le in qs[offset:offset+limit]]
-    return JsonResponse({"total": total, "items": items})
-
-
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    _XLSX_OK = True
-except Exception:
-    _XLSX_OK = False
+    """
+    Keyset pages on (created_at, id): ?limit=&cursor= (next / prev cursors in
+    the response). ?offset= still pages by OFFSET for older clients. Totals
+    only with ?count=exact or ?count=estimate (the default in offset mode).
+    """
+    qs = _filter_logs(request.GET)
+    try:
+        limit = int(request.GET.get("limit") or LOG_PAGE_LIMIT)
+        offset = int(request.GET.get("offset") or 0)
+    except ValueError:
+        return JsonResponse({"ok": False, "msg": "Invalid limit or offset"}, status=400)
+    limit = max(1, min(limit, LOG_PAGE_MAX_LIMIT))
+    count = request.GET.get("count") or ("estimate" if "offset" in request.GET else "")
+    if count not in ("", "none", "exact", "estimate"):
+        return JsonResponse({"ok": False, "msg": "Invalid count. Use exact, estimate or none."}, status=400)
+
+    action_labels = dict(LogEntry.Action.choices)
+    rows_qs = qs.values(*LOG_ROW_FIELDS)
+    if "offset" in request.GET and "cursor" not in request.GET:
+        rows = list(rows_qs.order_by(*LOG_ORDERING)[max(offset, 0):max(offset, 0) + limit])
+        payload = {"items": [_log_row(r, action_labels) for r in rows]}
+    else:
+        token = request.GET.get("cursor") or ""
+        try:
+            cursor = decode_cursor(token) if token else None
+            rows, next_cursor, prev_cursor = keyset_page(
+                rows_qs, LOG_ORDERING, limit, cursor=cursor, key_fn=_log_cursor_value,
+                tag="archive" if _is_archive(request.GET) else "log",
+            )
+        except InvalidCursor as e:
+            return JsonResponse({"ok": False, "msg": str(e)}, status=400)
+        payload = {
+            "items": [_log_row(r, action_labels) for r in rows],
+            "next": next_cursor,
+            "prev": prev_cursor,
+            "limit": limit,
+        }
+
+    if count in ("exact", "estimate"):
+        payload["total"], payload["estimated"] = _log_count(qs, request.GET, count)
+    return JsonResponse(payload)
+
+
+# ---------- export ----------
+LOG_EXPORT_HEADERS = ["User", "Action", "Details", "Date"]
+LOG_EXPORT_KEYS = ["user", "action", "details", "date"]
+LOG_EXPORT_CHUNK = 2000
+
+def _log_export_rows(qs):
+    """Yield export rows from a values() projection read in keyset chunks."""
+    action_labels = dict(LogEntry.Action.choices)
+    rows = keyset_iterator(qs.values(*LOG_ROW_FIELDS), LOG_ORDERING, chunk_size=LOG_EXPORT_CHUNK)
+    for r in rows:
+        row = _log_row(r, action_labels)
+        yield tuple(row[k] for k in LOG_EXPORT_KEYS)
 
 @login_required
 def api_download(request):
-    if not _XLSX_OK:
+    """?format=xlsx (default), csv or ndjson.gz, using the same filters as the list."""
+    fmt = (request.GET.get("format") or "xlsx").lower()
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+    if fmt == "xlsx" and not EXCEL_AVAILABLE:
         return JsonResponse({"error": "openpyxl not installed"}, status=500)
 
-    qs = _filter_logs(request)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Activity Log"
-
-    # header style
-    header_fill = PatternFill(start_color="102B86", end_color="102B86", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-
-    headers = ["User", "Action", "Details", "Date"]
-    for idx, h in enumerate(headers, 1):
-        c = ws.cell(row=1, column=idx, value=h)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = header_alignment
-
-    r = 2
-    for le in qs:
-        ws.cell(row=r, column=1, value=(le.user.get_full_name() or le.user.get_username()))
-        ws.cell(row=r, column=2, value=(le.get_action_display() if hasattr(le, "get_action_display") else le.action))
-        ws.cell(row=r, column=3, value=le.details)
-        ws.cell(row=r, column=4, value=le.created_at.strftime("%Y-%m-%d %H:%M"))
-        r += 1
-
-    # auto width
-    for col in ws.columns:
-        max_len = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                max_len = max(max_len, len(str(cell.value)))
-            except Exception:
-                pass
-        ws.column_dimensions[column].width = min(max_len + 2, 60)
-
-    from io import BytesIO
-    buff = BytesIO()
-    wb.save(buff)
-    buff.seek(0)
-
-    resp = HttpResponse(
-        buff.read(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    qs = _filter_logs(request.GET)
+    return export_response(
+        fmt,
+        "activity_log",
+        "Activity Log",
+        LOG_EXPORT_HEADERS,
+        LOG_EXPORT_KEYS,
+        _log_export_rows(qs),
+        max_width=60,
     )
-    resp["Content-Disposition"] = 'attachment; filename="activity_log.xlsx"'
-    return resp
+
+
+# ---------- file archives ----------
+@login_required
+def api_archives(request):
+    """Monthly archive files written by `manage.py archive_logs --to file`; ?daterange= picks overlapping ones."""
+    qs = LogArchiveFile.objects.all()
+    start, end = _parse_range_str((request.GET.get("daterange") or "").strip())
+    if start and end:
+        qs = qs.filter(start__lt=end + timedelta(days=1), end__gt=start)
+    items = [{
+        "id": a.pk,
+        "start": a.start.isoformat(),
+        "end": a.end.isoformat(),
+        "rows": a.rows,
+        "download_url": reverse("log:api-archive-download", args=[a.pk]),
+    } for a in qs]
+    return JsonResponse({"items": items})
+
+@login_required
+def api_archive_download(request, pk: int):
+    archive = get_object_or_404(LogArchiveFile, pk=pk)
+    try:
+        name = archive.file.name.rsplit("/", 1)[-1]
+        return FileResponse(archive.file.open("rb"), as_attachment=True, filename=name)
+    except FileNotFoundError:
+        raise Http404("File not found")